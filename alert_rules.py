@@ -0,0 +1,131 @@
+"""Declarative alert rules evaluated over whole columns at once.
+
+A rule is a boolean expression over the columns of a daily frame, e.g.
+"Anomaly == -1 and OrderCount < low_order_threshold". Names that are not
+columns are parameters: ALERT_PARAMS gives their defaults and per-laundry
+overrides replace them row by row. A rule can be limited to some laundries.
+Expressions are compiled once into numpy operations, so each rule is a single
+vectorized pass over every laundry and day in the frame.
+
+Rules and overrides can also be read from ALERT_CONFIG_PATH (JSON with
+"rules", "params" and "overrides" keys).
+"""
+import ast
+import json
+import operator
+from functools import lru_cache, reduce
+import numpy as np
+import pandas as pd
+
+ALERT_CONFIG_PATH = "alert_rules.json"
+NORMAL_ALERT = "✅ Normal"
+
+# Evaluated in order; a day gets the message of the first rule it matches
+ALERT_RULES = [
+    {"name": "high_usage_low_orders",
+     "when": "Anomaly == -1 and OrderCount < low_order_threshold",
+     "message": "🚨 Alert: High usage on low order day"},
+]
+ALERT_PARAMS = {"low_order_threshold": 5}
+
+_OPERATORS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+}
+
+def _compile(node):
+    if isinstance(node, ast.BoolOp):
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        parts = [_compile(value) for value in node.values]
+        return lambda env: reduce(combine, (part(env) for part in parts))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+        operand = _compile(node.operand)
+        negate = np.logical_not if isinstance(node.op, ast.Not) else np.negative
+        return lambda env: negate(operand(env))
+    if isinstance(node, ast.Compare) and all(type(op) in _OPERATORS for op in node.ops):
+        terms = [_compile(node.left)] + [_compile(comparator) for comparator in node.comparators]
+        ops = [_OPERATORS[type(op)] for op in node.ops]
+        return lambda env: reduce(np.logical_and, (op(terms[i](env), terms[i + 1](env)) for i, op in enumerate(ops)))
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        left, right, op = _compile(node.left), _compile(node.right), _OPERATORS[type(node.op)]
+        return lambda env: op(left(env), right(env))
+    if isinstance(node, ast.Name):
+        return lambda env: env[node.id]
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+        return lambda env: node.value
+    raise ValueError(f"Unsupported alert rule syntax: {ast.unparse(node)}")
+
+@lru_cache(maxsize=4096)
+def compile_rule(expression):
+    """Compile a rule expression into a function of a column environment returning a boolean array"""
+    return _compile(ast.parse(expression, mode="eval").body)
+
+def rule_names(expression):
+    """Column and parameter names a rule expression refers to"""
+    return {node.id for node in ast.walk(ast.parse(expression, mode="eval")) if isinstance(node, ast.Name)}
+
+def load_alert_config(path=ALERT_CONFIG_PATH):
+    """(rules, params, overrides) from the JSON config, or the module defaults when it is missing"""
+    try:
+        with open(path, "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return ALERT_RULES, ALERT_PARAMS, {}
+    return (config.get("rules", ALERT_RULES), {**ALERT_PARAMS, **config.get("params", {})},
+            config.get("overrides", {}))
+
+def _resolve_config(rules, params, overrides):
+    """Explicit arguments, falling back to the config file (or module defaults) for the rest"""
+    config_rules, config_params, config_overrides = load_alert_config() if rules is None else (rules, ALERT_PARAMS, {})
+    return (config_rules, config_params if params is None else params,
+            config_overrides if overrides is None else overrides)
+
+def _environment(frame, entities, names, params, overrides):
+    """Columns and per-row parameter values for the names used by the rules"""
+    env = {}
+    for name in names:
+        if name in frame:
+            env[name] = frame[name].to_numpy()
+        elif name in params:
+            per_entity = {entity: values[name] for entity, values in overrides.items() if name in values}
+            if per_entity and entities is not None:
+                env[name] = pd.Series(entities).map(per_entity).fillna(params[name]).to_numpy()
+            else:
+                env[name] = params[name]
+        else:
+            raise KeyError(f"Alert rule refers to unknown column or parameter: {name}")
+    return env
+
+def match_rules(frame, entities=None, rules=None, params=None, overrides=None):
+    """Boolean frame (rows x rules): which rules each row matches
+
+    entities gives each row's laundry (or one id for the whole frame) and is
+    used for per-laundry overrides and rule scopes ("laundries": [...]).
+    """
+    rules, params, overrides = _resolve_config(rules, params, overrides)
+    if entities is not None:
+        entities = np.broadcast_to(np.asarray(entities, dtype=object), len(frame)).astype(str)
+
+    env = _environment(frame, entities, set().union(*(rule_names(rule["when"]) for rule in rules)), params,
+                       {str(entity): values for entity, values in overrides.items()})
+    evaluated, matches = {}, {}
+    for rule in rules:
+        expression = rule["when"]
+        if expression not in evaluated:
+            evaluated[expression] = np.broadcast_to(compile_rule(expression)(env), len(frame)).astype(bool)
+        matched = evaluated[expression]
+        if rule.get("laundries") is not None and entities is not None:
+            matched = matched & np.isin(entities, [str(entity) for entity in rule["laundries"]])
+        matches[rule["name"]] = matched
+    return pd.DataFrame(matches, index=frame.index)
+
+def evaluate_alerts(frame, entities=None, rules=None, params=None, overrides=None, default=NORMAL_ALERT):
+    """Alert message per row: the first matching rule's message, or default"""
+    rules, params, overrides = _resolve_config(rules, params, overrides)
+    if not rules:
+        return pd.Series(default, index=frame.index, dtype=object)
+    matches = match_rules(frame, entities, rules, params, overrides)
+    messages = np.select([matches[rule["name"]].to_numpy() for rule in rules], [rule["message"] for rule in rules],
+                         default=default)
+    return pd.Series(messages, index=frame.index, dtype=object)
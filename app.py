@@ -2,7 +2,7 @@ import streamlit as st
 from datetime import datetime
 from customer_analysis import customer_section
 from laundry_analysis import laundry_section
-from resources import load_data
+from resources import load_data, load_memory_report, load_entity_index, load_daily_cube
 import styles
 
 def main():
@@ -51,13 +51,15 @@ def main():
         st.markdown("**System Status:**")
         st.success("Operational")
         st.markdown(f"**Data Records:** {len(df)}")
+        raw_bytes, compact_bytes = load_memory_report()
+        st.markdown(f"**Data Memory:** {compact_bytes / 1e6:.2f} MB (from {raw_bytes / 1e6:.2f} MB)")
         st.markdown(f"**Last Updated:** {datetime.now().strftime('%Y-%m-%d')}")
     
     # Main content routing
     if st.session_state.main_section == "customer":
-        customer_section(df)
+        customer_section(df, load_entity_index("TenantID"), load_daily_cube("TenantID"))
     elif st.session_state.main_section == "laundry":
-        laundry_section(df)
+        laundry_section(df, load_entity_index("LaundryID"), load_daily_cube("LaundryID"))
     else:
         show_welcome_screen(df)
 
@@ -0,0 +1,19 @@
+"""Crash- and race-safe file writes shared by the caches, stores and registry."""
+import os
+import tempfile
+
+def atomic_write(path, write):
+    """Call write(f) on a unique temp file next to path (binary mode), then rename it over path
+
+    Readers see either the old file or the complete new one; concurrent
+    writers never share a temp file, and a failed write leaves nothing behind.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,135 @@
+"""Rolling-origin backtesting of the laundry and customer forecasters.
+
+For each cutoff the forecaster sees only the history up to that day and is
+scored on the following horizon; entities are spread over a process pool.
+
+Usage:
+    python backtest.py laundries|tenants [--method auto rf ...] [--cutoffs N] [--step DAYS]
+                                         [--horizon DAYS] [--workers N]
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from batch_forecast import parallel_map
+from customer_analysis import prepare_enhanced_data, forecast_intermittent_demand, FORECAST_MODE
+from laundry_analysis import prepare_laundry_data, forecast_laundry_demand
+from resources import read_dataset, build_daily_cube, tenant_histories
+
+BACKTEST_CUTOFFS = 6
+BACKTEST_STEP = 7
+BACKTEST_HORIZON = 14
+MIN_TRAIN_DAYS = 28
+
+def rolling_cutoffs(last_date, n_cutoffs=BACKTEST_CUTOFFS, step=BACKTEST_STEP, horizon=BACKTEST_HORIZON):
+    """Forecast origins, newest first, each leaving a full horizon of actuals after it"""
+    latest = pd.Timestamp(last_date) - pd.Timedelta(days=horizon)
+    return [latest - pd.Timedelta(days=step * k) for k in range(n_cutoffs)]
+
+def fold_metrics(pred, actual):
+    """Error statistics for one forecast fold"""
+    pred = np.asarray(pred, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    errors = pred - actual
+    nonzero = actual != 0
+    return {
+        "mae": float(np.mean(np.abs(errors))),
+        "mape": float(np.mean(np.abs(errors[nonzero]) / actual[nonzero])) if nonzero.any() else np.nan,
+        "bias": float(np.mean(errors)),
+        "abs_error": float(np.sum(np.abs(errors))),
+        "actual": float(np.sum(actual)),
+        "days": len(actual),
+    }
+
+def _score_fold(entity_id, method, cutoff, horizon, forecast, actual_series, fit_s):
+    """Align a forecast with the observed series and compute the fold's metrics
+
+    Cutoffs leave a full horizon inside the dataset, so days after an entity's
+    last order are real zero-demand days and are scored as such.
+    """
+    forecast = forecast[forecast["ds"] <= cutoff + pd.Timedelta(days=horizon)]
+    actual = actual_series.reindex(forecast["ds"], fill_value=0).to_numpy()
+    return {"entity": entity_id, "method": method, "cutoff": cutoff, "fit_ms": fit_s * 1000,
+            **fold_metrics(forecast["yhat"].to_numpy(), actual)}
+
+def _laundry_folds(task):
+    """Worker: every cutoff and method for one laundry"""
+    laundry_id, daily, cutoffs, horizon, methods = task
+    actual_series = daily.set_index("ds")["y"].asfreq("D", fill_value=0)
+    rows = []
+    for cutoff in cutoffs:
+        history = daily[daily["ds"] <= cutoff]
+        if len(history) < MIN_TRAIN_DAYS:
+            continue
+        for method in methods:
+            start = time.perf_counter()
+            _, _, forecast = forecast_laundry_demand(history, horizon, method=method)
+            rows.append(_score_fold(laundry_id, method, cutoff, horizon, forecast, actual_series,
+                                    time.perf_counter() - start))
+    return rows
+
+def _tenant_folds(task):
+    """Worker: every cutoff and method for one tenant"""
+    tenant_id, customer_data, customer_daily, cutoffs, horizon, methods, mode = task
+    actual_series = prepare_enhanced_data(customer_data, customer_daily).set_index("ds")["orders"]
+    rows = []
+    for cutoff in cutoffs:
+        history_daily = customer_daily[customer_daily.index <= cutoff]
+        if len(history_daily) == 0:
+            continue
+        history_data = customer_data[customer_data["StartDate"] <= cutoff]
+        daily_orders = prepare_enhanced_data(history_data, history_daily)
+        for method in methods:
+            start = time.perf_counter()
+            actual, forecast = forecast_intermittent_demand(daily_orders, history_data, mode=mode, method=method)
+            future = forecast[forecast["ds"] > actual["ds"].max()].head(horizon)
+            rows.append(_score_fold(tenant_id, method, cutoff, horizon, future, actual_series,
+                                    time.perf_counter() - start))
+    return rows
+
+def summarize(folds):
+    """Per-method MAE / MAPE / bias, weighted accuracy (1 - WAPE) and fit time"""
+    grouped = folds.groupby("method")
+    summary = grouped[["mae", "mape", "bias", "fit_ms"]].mean()
+    summary["accuracy"] = 1 - grouped["abs_error"].sum() / grouped["actual"].sum()
+    summary["folds"] = grouped.size()
+    return summary.round(3)
+
+def run_backtest(target, methods=("auto",), n_cutoffs=BACKTEST_CUTOFFS, step=BACKTEST_STEP,
+                 horizon=BACKTEST_HORIZON, workers=None, mode=FORECAST_MODE):
+    """Run rolling-origin folds for every laundry or tenant; returns (summary, per-fold frame)"""
+    df = read_dataset()
+    cutoffs = rolling_cutoffs(df["StartDate"].max(), n_cutoffs, step, horizon)
+    methods = list(methods)
+
+    if target == "laundries":
+        daily_cube = build_daily_cube(df, "LaundryID")
+        worker = _laundry_folds
+        tasks = [
+            (str(laundry_id), prepare_laundry_data(None, laundry_id, daily_cube=daily_cube), cutoffs, horizon, methods)
+            for laundry_id in daily_cube.index.get_level_values(0).unique()
+        ]
+    else:
+        worker = _tenant_folds
+        tasks = [history + (cutoffs, horizon, methods, mode) for history in tenant_histories(df)]
+
+    folds = pd.DataFrame([row for rows in parallel_map(worker, tasks, workers) for row in rows])
+    return summarize(folds), folds
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the forecasters")
+    parser.add_argument("target", choices=["laundries", "tenants"], help="which entities to evaluate")
+    parser.add_argument("--method", nargs="+", default=["auto"], help="forecast methods to compare")
+    parser.add_argument("--cutoffs", type=int, default=BACKTEST_CUTOFFS, help="number of forecast origins")
+    parser.add_argument("--step", type=int, default=BACKTEST_STEP, help="days between origins")
+    parser.add_argument("--horizon", type=int, default=BACKTEST_HORIZON, help="days scored after each origin")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary, folds = run_backtest(args.target, args.method, args.cutoffs, args.step, args.horizon, args.workers)
+    print(summary.to_string())
+    print(f"{len(folds)} folds in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Headless batch forecasting for the whole fleet.
+
+Usage:
+    python batch_forecast.py laundries [--workers N] [--horizon DAYS] [--method METHOD]
+    python batch_forecast.py tenants [--workers N] [--mode direct|recursive] [--method METHOD]
+
+Schedule `tenants` nightly (e.g. cron) so customer views become lookups;
+tenants missing from the store are still trained live by the dashboard.
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import pandas as pd
+from customer_analysis import (prepare_enhanced_data, forecast_intermittent_demand, forecast_tenants_recursive,
+                               FORECAST_PARAMS, FORECAST_HORIZON, FORECAST_MODE,
+                               FORECAST_METHOD)
+from forecast_store import save_forecasts
+from forecasting import RESOURCE_TARGETS
+from laundry_analysis import (prepare_laundry_data, forecast_laundry_demand, forecast_fleet_global,
+                              LAUNDRY_FORECAST_PARAMS, LAUNDRY_FORECAST_DAYS, LAUNDRY_FORECAST_METHOD)
+from resources import read_dataset, dataset_version, build_daily_cube, tenant_histories
+
+FORECAST_COLUMNS = ["ds", "yhat", "yhat_lower", "yhat_upper"] + [f"{name}_hat" for name in RESOURCE_TARGETS]
+
+def parallel_map(worker, tasks, workers=None):
+    """Results of worker over tasks from a process pool, handing each worker a few chunks"""
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(worker, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+def _forecast_laundry(task):
+    """Worker: forecast one laundry from its daily demand series"""
+    laundry_id, daily, horizon, params, method = task
+    _, _, forecast = forecast_laundry_demand(daily, horizon, params, entity_id=laundry_id, method=method)
+    forecast.insert(0, "LaundryID", laundry_id)
+    return forecast[["LaundryID"] + FORECAST_COLUMNS]
+
+def _forecast_laundries_parallel(laundry_ids, daily_cube, workers, horizon, params, method):
+    """Fan per-laundry models out over a process pool"""
+    tasks = [(laundry_id, prepare_laundry_data(None, laundry_id, daily_cube=daily_cube), horizon, params, method)
+             for laundry_id in laundry_ids]
+    return pd.concat(parallel_map(_forecast_laundry, tasks, workers), ignore_index=True)
+
+def run_laundry_batch(workers=None, horizon=LAUNDRY_FORECAST_DAYS, params=LAUNDRY_FORECAST_PARAMS,
+                      method=LAUNDRY_FORECAST_METHOD):
+    """Forecast every laundry (in parallel, or with one global model) and write the results to the store"""
+    df = read_dataset()
+    daily_cube = build_daily_cube(df, "LaundryID")
+    laundry_ids = [str(laundry_id) for laundry_id in daily_cube.index.get_level_values(0).unique()]
+
+    start = time.perf_counter()
+    if method == "global":
+        _, forecasts = forecast_fleet_global(df, daily_cube, horizon, params)
+    else:
+        forecasts = _forecast_laundries_parallel(laundry_ids, daily_cube, workers, horizon, params, method)
+
+    meta = {
+        "data_version": dataset_version(),
+        "params": params,
+        "horizon": horizon,
+        "method": method,
+        "entities": len(laundry_ids),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    path = save_forecasts(forecasts, "laundry", meta)
+    print(f"Forecast {len(laundry_ids)} laundries in {time.perf_counter() - start:.1f}s -> {path}")
+    return forecasts
+
+def _forecast_tenant(task):
+    """Worker: forecast one tenant, keeping only the future rows"""
+    tenant_id, customer_data, customer_daily, params, mode, method = task
+    daily_orders = prepare_enhanced_data(customer_data, customer_daily)
+    historical, forecast = forecast_intermittent_demand(daily_orders, customer_data, params,
+                                                        entity_id=tenant_id, mode=mode, method=method)
+    future = forecast[forecast["ds"] > historical["ds"].max()].copy()
+    future.insert(0, "TenantID", tenant_id)
+    return future[["TenantID"] + FORECAST_COLUMNS]
+
+def _forecast_tenants_shared(histories, params, method):
+    """Recursive forecasts for every tenant in one process, tree-routed tenants sharing a model"""
+    tenants = [(tenant_id, prepare_enhanced_data(customer_data, customer_daily), customer_data)
+               for tenant_id, customer_data, customer_daily in histories]
+    forecasts = forecast_tenants_recursive(tenants, params, method)
+    return pd.concat([forecast.assign(TenantID=tenant_id)[["TenantID"] + FORECAST_COLUMNS]
+                      for tenant_id, forecast in forecasts.items()], ignore_index=True)
+
+def run_tenant_batch(workers=None, params=FORECAST_PARAMS, mode=FORECAST_MODE, method=FORECAST_METHOD):
+    """Precompute the customer demand forecast for every tenant
+
+    Recursive mode steps all tenants together through one shared model, so it
+    runs in a single process; direct mode fans per-tenant models out.
+    """
+    histories = list(tenant_histories(read_dataset()))
+
+    start = time.perf_counter()
+    if mode == "recursive":
+        forecasts = _forecast_tenants_shared(histories, params, method)
+    else:
+        tasks = [history + (params, mode, method) for history in histories]
+        forecasts = pd.concat(parallel_map(_forecast_tenant, tasks, workers), ignore_index=True)
+
+    meta = {
+        "data_version": dataset_version(),
+        "params": params,
+        "horizon": FORECAST_HORIZON,
+        "mode": mode,
+        "method": method,
+        "entities": len(histories),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    path = save_forecasts(forecasts, "customer", meta)
+    print(f"Forecast {len(histories)} tenants in {time.perf_counter() - start:.1f}s -> {path}")
+    return forecasts
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute fleet forecasts for the dashboard")
+    parser.add_argument("target", choices=["laundries", "tenants"], help="which entities to forecast")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--horizon", type=int, default=None, help="forecast horizon in days")
+    parser.add_argument("--mode", choices=["direct", "recursive"], default=FORECAST_MODE,
+                        help="customer forecast mode")
+    parser.add_argument("--method", choices=["auto", "rf", "xgb", "global", "seasonal_naive", "ses", "croston", "sba", "tsb"],
+                        default="auto", help="forecast method (auto routes each series; global is laundries only)")
+    args = parser.parse_args()
+    if args.target == "tenants" and args.method == "global":
+        parser.error("--method global is only available for laundries")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.target == "laundries":
+        run_laundry_batch(args.workers, args.horizon or LAUNDRY_FORECAST_DAYS, method=args.method)
+    elif args.target == "tenants":
+        run_tenant_batch(args.workers, mode=args.mode, method=args.method)
+
+if __name__ == "__main__":
+    main()
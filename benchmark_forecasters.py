@@ -0,0 +1,81 @@
+"""Compare the RandomForest and XGBoost (hist) forecasters on the fleet data.
+
+Each series is split into history and its last HOLDOUT_DAYS days; both
+backends are fitted on the history exactly as in production (same features,
+multi-output orders + resource targets) and scored on the holdout orders.
+
+Usage:
+    python benchmark_forecasters.py [--holdout DAYS] [--tenants N]
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from customer_analysis import prepare_enhanced_data, FORECAST_PARAMS, FORECAST_TARGETS
+from features import laundry_calendar_features
+from forecasting import tree_model_factory, split_outputs, TREE_METHODS
+from laundry_analysis import prepare_laundry_data, LAUNDRY_FEATURES, LAUNDRY_TARGETS, LAUNDRY_FORECAST_PARAMS
+from resources import read_dataset, build_daily_cube, tenant_histories
+
+HOLDOUT_DAYS = 28
+
+def _score(backend, rf_params, X_train, y_train, X_test, y_test):
+    make_model, params = tree_model_factory(backend, rf_params)
+    model = make_model(**params)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_s = time.perf_counter() - start
+    start = time.perf_counter()
+    pred, _ = split_outputs(model.predict(X_test))
+    predict_s = time.perf_counter() - start
+    return {"fit_ms": fit_s * 1000, "predict_ms": predict_s * 1000,
+            "mae": float(np.mean(np.abs(pred - y_test[:, 0])))}
+
+def _split(dates, X, y, holdout):
+    cutoff = dates.max() - pd.Timedelta(days=holdout)
+    train = (dates <= cutoff).to_numpy()
+    return X[train], y[train], X[~train], y[~train]
+
+def laundry_series(df):
+    """(entity, dates, X, y) for every laundry, using the laundry forecaster's features and targets"""
+    daily_cube = build_daily_cube(df, "LaundryID")
+    for laundry_id in daily_cube.index.get_level_values(0).unique():
+        daily = prepare_laundry_data(None, laundry_id, daily_cube=daily_cube)
+        X = laundry_calendar_features(daily["ds"])[LAUNDRY_FEATURES]
+        yield laundry_id, daily["ds"], X, daily[LAUNDRY_TARGETS].to_numpy()
+
+def tenant_series(df, limit=None):
+    """(entity, dates, X, y) for tenants, using the customer forecaster's features and targets"""
+    for i, (tenant_id, customer_data, customer_daily) in enumerate(tenant_histories(df)):
+        if limit is not None and i >= limit:
+            break
+        daily = prepare_enhanced_data(customer_data, customer_daily)
+        yield tenant_id, daily["ds"], daily.drop(columns=FORECAST_TARGETS + ["ds"]), daily[FORECAST_TARGETS].to_numpy()
+
+def run_benchmark(holdout=HOLDOUT_DAYS, tenant_limit=None):
+    """Per-backend fit/predict latency and holdout MAE for laundries and tenants"""
+    df = read_dataset()
+    rows = []
+    for kind, series, rf_params in [("laundry", laundry_series(df), LAUNDRY_FORECAST_PARAMS),
+                                    ("customer", tenant_series(df, tenant_limit), FORECAST_PARAMS)]:
+        for entity_id, dates, X, y in series:
+            X_train, y_train, X_test, y_test = _split(dates, X, y, holdout)
+            if len(X_train) == 0 or len(X_test) == 0:
+                continue
+            for backend in TREE_METHODS:
+                rows.append({"kind": kind, "entity": entity_id, "backend": backend,
+                             **_score(backend, rf_params, X_train, y_train, X_test, y_test)})
+    results = pd.DataFrame(rows)
+    return results.groupby(["kind", "backend"])[["fit_ms", "predict_ms", "mae"]].mean().round(3), results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RandomForest vs XGBoost forecasters")
+    parser.add_argument("--holdout", type=int, default=HOLDOUT_DAYS, help="days held out per series")
+    parser.add_argument("--tenants", type=int, default=None, help="limit the number of tenants")
+    args = parser.parse_args()
+
+    summary, _ = run_benchmark(args.holdout, args.tenants)
+    print(summary.to_string())
+
+if __name__ == "__main__":
+    main()
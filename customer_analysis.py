@@ -3,96 +3,186 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from sklearn.ensemble import RandomForestRegressor
 from datetime import datetime
 import io
-from resources import load_data
+import time
+from features import LAG_DAYS, ROLLING_WINDOWS, horizon_dates, calendar_features, future_feature_matrix
+from forecast_store import stored_forecast
+from forecasting import (recursive_forecast, route_series, series_profile, simple_forecast, log_route,
+                         tree_model_factory, TREE_METHODS, forest_quantile_intervals, has_tree_intervals,
+                         RESOURCE_TARGETS, split_outputs, per_order_resources)
+from model_registry import fit_or_load
+from resources import load_data, load_dataset_version, drop_unused_categories, select_entity, daily_totals, entity_daily
 
-def prepare_enhanced_data(data):
+FORECAST_PARAMS = {
+    "n_estimators": 200,
+    "min_samples_split": 5,
+    "min_samples_leaf": 2,
+    "random_state": 42
+}
+FORECAST_HORIZON = 90
+# "direct" holds lag/rolling features at their last observed values;
+# "recursive" feeds each day's prediction into the next day's lags
+FORECAST_MODE = "direct"
+# "rf", "xgb", "seasonal_naive", "ses", "croston", "sba", "tsb", or "auto" to route each
+# series to the cheapest adequate model (see forecasting.route_series)
+FORECAST_METHOD = "auto"
+# Tenants whose forecasts stay in memory; least recently viewed are evicted first
+FORECAST_CACHE_SIZE = 128
+# Columns of prepare_enhanced_data that are forecast targets rather than features
+FORECAST_TARGETS = ["orders"] + RESOURCE_TARGETS
+
+def prepare_enhanced_data(data, daily=None):
     """Prepare time series data with features for forecasting"""
-    min_date = data["StartDate"].min()
-    max_date = data["StartDate"].max()
+    if daily is None:
+        daily = daily_totals(data)
+    min_date = daily.index.min()
+    max_date = daily.index.max()
     full_dates = pd.date_range(start=min_date, end=max_date, freq='D')
     
-    daily_orders = data.groupby("StartDate").size().reset_index(name="orders")
-    daily_orders = daily_orders.rename(columns={"StartDate": "ds"})
-    
-    full_df = pd.DataFrame({"ds": full_dates})
-    daily_orders = full_df.merge(daily_orders, on="ds", how="left").fillna(0)
-    
-    daily_orders["day_of_week"] = daily_orders["ds"].dt.weekday
-    daily_orders["is_weekend"] = daily_orders["day_of_week"].isin([5, 6]).astype(int)
-    daily_orders["month"] = daily_orders["ds"].dt.month
-    daily_orders["day_of_month"] = daily_orders["ds"].dt.day
-    daily_orders["time_idx"] = (daily_orders["ds"] - daily_orders["ds"].min()).dt.days
+    daily_orders = daily[FORECAST_TARGETS].astype(float).reindex(full_dates, fill_value=0)
+    daily_orders = daily_orders.rename_axis("ds").reset_index()
+    daily_orders = pd.concat([daily_orders, calendar_features(daily_orders["ds"], min_date)], axis=1)
     
-    daily_orders["orders_7d_avg"] = daily_orders["orders"].rolling(window=7, min_periods=1).mean()
-    daily_orders["orders_28d_avg"] = daily_orders["orders"].rolling(window=28, min_periods=1).mean()
+    # Shifted a day so each row only sees earlier orders, as in direct and recursive forecasting
+    previous = daily_orders["orders"].shift(1)
+    for name, window in ROLLING_WINDOWS.items():
+        daily_orders[name] = previous.rolling(window=window, min_periods=1).mean().fillna(0)
     
-    for lag in [1, 7, 14, 28]:
+    for lag in LAG_DAYS:
         daily_orders[f"lag_{lag}"] = daily_orders["orders"].shift(lag).fillna(0)
     
-    holidays = data[data["IsHoliday"] == 1]["StartDate"].unique()
+    holidays = daily.index[daily["holiday"] == 1]
     daily_orders["is_holiday"] = daily_orders["ds"].isin(holidays).astype(int)
     
     return daily_orders.dropna()
 
-def forecast_intermittent_demand(daily_data, customer_data):
-    """Forecast future demand using Random Forest"""
-    holidays = customer_data[customer_data["IsHoliday"] == 1]["StartDate"].unique()
-    
-    X = daily_data.drop(columns=["orders", "ds"])
-    y = daily_data["orders"]
-    
-    train_size = int(len(daily_data) * 0.8)
-    X_train, X_test = X[:train_size], X[train_size:]
-    y_train, y_test = y[:train_size], y[train_size:]
-    
-    model = RandomForestRegressor(
-        n_estimators=200,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        random_state=42
-    )
-    model.fit(X_train, y_train)
-    
-    future_days = 90
-    last_date = daily_data["ds"].max()
-    future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=future_days, freq='D')
-    
-    future_data = []
-    for i, date in enumerate(future_dates):
-        features = {
-            "day_of_week": date.weekday(),
-            "is_weekend": 1 if date.weekday() in [5, 6] else 0,
-            "month": date.month,
-            "day_of_month": date.day,
-            "time_idx": (date - daily_data["ds"].min()).days,
-            "orders_7d_avg": daily_data["orders_7d_avg"].iloc[-1],
-            "orders_28d_avg": daily_data["orders_28d_avg"].iloc[-1],
-            "lag_1": daily_data["orders"].iloc[-1],
-            "lag_7": daily_data["orders"].iloc[-7] if len(daily_data) >= 7 else 0,
-            "lag_14": daily_data["orders"].iloc[-14] if len(daily_data) >= 14 else 0,
-            "lag_28": daily_data["orders"].iloc[-28] if len(daily_data) >= 28 else 0,
-            "is_holiday": 1 if date in holidays else 0
-        }
-        future_data.append(features)
-    
-    future_df = pd.DataFrame(future_data)
-    future_pred = model.predict(future_df)
-    
-    forecast_df = pd.DataFrame({
+def _forest_forecast(daily_data, holidays, model_params, entity_id, mode, backend="rf"):
+    """Fit (or load) the demand forest (or XGBoost) and predict orders and resources over the horizon"""
+    X = daily_data.drop(columns=FORECAST_TARGETS + ["ds"])
+    y = daily_data[FORECAST_TARGETS]
+    
+    make_model, params = tree_model_factory(backend, model_params or FORECAST_PARAMS)
+    if entity_id is None:
+        model = make_model(**params)
+        model.fit(X, y)
+    else:
+        model = fit_or_load(f"customer_{backend}", entity_id, list(X.columns), make_model, params, X, y)
+    
+    if mode == "recursive":
+        (future_dates,), _, future_df = recursive_forecast(model, [daily_data], FORECAST_HORIZON,
+                                                           X.columns, [holidays])
+    else:
+        future_dates = horizon_dates(daily_data["ds"].max(), FORECAST_HORIZON)
+        future_df = future_feature_matrix(daily_data, future_dates, holidays, X.columns)
+    future_pred, resources = split_outputs(model.predict(future_df))
+    
+    if has_tree_intervals(model):
+        lower, upper = forest_quantile_intervals(model, future_df)
+    else:
+        lower, upper = future_pred * 0.7, future_pred * 1.3
+    return future_dates, future_pred, lower, upper, resources
+
+def _future_frame(future_dates, future_pred, lower, upper, resources):
+    return pd.DataFrame({
         "ds": future_dates,
         "yhat": np.maximum(0, future_pred),
-        "yhat_lower": np.maximum(0, future_pred * 0.7),
-        "yhat_upper": np.maximum(0, future_pred * 1.3)
+        "yhat_lower": np.maximum(0, lower),
+        "yhat_upper": np.maximum(0, upper),
+        **resources
     })
+
+def forecast_intermittent_demand(daily_data, customer_data, model_params=None, entity_id=None, mode=FORECAST_MODE,
+                                 method=FORECAST_METHOD):
+    """Forecast future demand with the forest or a cheaper model chosen by routing"""
+    holidays = customer_data[customer_data["IsHoliday"] == 1]["StartDate"].unique()
+    
+    if method == "auto":
+        method, profile = route_series(daily_data["orders"])
+    else:
+        profile = series_profile(daily_data["orders"])
+    
+    start = time.perf_counter()
+    if method in TREE_METHODS:
+        future_dates, future_pred, lower, upper, resources = _forest_forecast(daily_data, holidays, model_params,
+                                                                              entity_id, mode, method)
+    else:
+        future_dates = horizon_dates(daily_data["ds"].max(), FORECAST_HORIZON)
+        future_pred = simple_forecast(daily_data["orders"], FORECAST_HORIZON, method)
+        lower, upper = future_pred * 0.7, future_pred * 1.3
+        resources = per_order_resources(daily_data["orders"], daily_data, np.maximum(0, future_pred))
+    log_route(entity_id, method, profile, time.perf_counter() - start)
+    
+    forecast_df = _future_frame(future_dates, future_pred, lower, upper, resources)
     
     historical = daily_data[["ds", "orders"]].rename(columns={"orders": "y"})
     forecast_df = pd.concat([historical, forecast_df], ignore_index=True)
     
     return historical, forecast_df
 
+def forecast_tenants_recursive(tenants, model_params=None, method=FORECAST_METHOD):
+    """Recursive forecasts for many tenants, sharing one tree model per backend
+
+    tenants holds (tenant_id, daily_orders, customer_data) tuples. Tenants
+    routed to a tree method are pooled: one model is fitted (or loaded) on all
+    their histories and recursive_forecast advances every one of them together,
+    one predict call per step for the whole batch. Other tenants get their
+    routed simple forecast. Returns {tenant_id: future forecast rows}.
+    """
+    forecasts, pooled = {}, {}
+    for tenant_id, daily_orders, customer_data in tenants:
+        tenant_method = route_series(daily_orders["orders"])[0] if method == "auto" else method
+        if tenant_method in TREE_METHODS:
+            pooled.setdefault(tenant_method, []).append((tenant_id, daily_orders, customer_data))
+            continue
+        historical, forecast = forecast_intermittent_demand(daily_orders, customer_data, model_params,
+                                                            entity_id=tenant_id, mode="recursive",
+                                                            method=tenant_method)
+        forecasts[tenant_id] = forecast[forecast["ds"] > historical["ds"].max()].reset_index(drop=True)
+    
+    for backend, members in pooled.items():
+        start = time.perf_counter()
+        tenant_ids, frames, customers = zip(*members)
+        # Date-ordered, so a day of new data appends rows and the registry can extend the model
+        history = pd.concat(frames, ignore_index=True).sort_values("ds", kind="stable")
+        X = history.drop(columns=FORECAST_TARGETS + ["ds"])
+        make_model, params = tree_model_factory(backend, model_params or FORECAST_PARAMS)
+        model = fit_or_load(f"customer_shared_{backend}", "fleet", list(X.columns), make_model, params,
+                            X, history[FORECAST_TARGETS])
+        
+        holidays = [customer[customer["IsHoliday"] == 1]["StartDate"].unique() for customer in customers]
+        future_dates, predictions, stacked = recursive_forecast(model, list(frames), FORECAST_HORIZON, X.columns,
+                                                                holidays)
+        # stacked holds one block of rows per step; reshape per-row outputs to (tenant, step)
+        def per_tenant(values):
+            return np.asarray(values).reshape(FORECAST_HORIZON, len(frames)).T
+        _, resources = split_outputs(model.predict(stacked))
+        resources = {name: per_tenant(values) for name, values in resources.items()}
+        if has_tree_intervals(model):
+            lower, upper = map(per_tenant, forest_quantile_intervals(model, stacked))
+        else:
+            lower, upper = predictions * 0.7, predictions * 1.3
+        
+        seconds = (time.perf_counter() - start) / len(frames)
+        for i, (tenant_id, daily_orders) in enumerate(zip(tenant_ids, frames)):
+            log_route(tenant_id, backend, series_profile(daily_orders["orders"]), seconds)
+            forecasts[tenant_id] = _future_frame(future_dates[i], predictions[i], lower[i], upper[i],
+                                                 {name: values[i] for name, values in resources.items()})
+    return forecasts
+
+@st.cache_data(max_entries=FORECAST_CACHE_SIZE, show_spinner=False)
+def cached_customer_forecast(tenant_id, data_version, model_params, _customer_data, _customer_daily=None,
+                             mode=FORECAST_MODE, method=FORECAST_METHOD):
+    """Forecast shared by all customer views, keyed on tenant, data version and model params"""
+    daily_orders = prepare_enhanced_data(_customer_data, _customer_daily)
+    stored = stored_forecast("customer", "TenantID", tenant_id, data_version, model_params, FORECAST_HORIZON,
+                             meta_match={"mode": mode, "method": method})
+    if stored is not None:
+        historical = daily_orders[["ds", "orders"]].rename(columns={"orders": "y"})
+        return historical, pd.concat([historical, stored], ignore_index=True)
+    return forecast_intermittent_demand(daily_orders, _customer_data, model_params, entity_id=tenant_id, mode=mode,
+                                        method=method)
+
 def generate_customer_insights(data):
     """Generate key insights about customer behavior"""
     insights = []
@@ -202,28 +292,34 @@ def generate_business_report(actual, forecast, customer_id, customer_data):
 """
     return report
 
-def customer_resource_analysis(customer_data):
+def customer_resource_analysis(customer_data, daily=None):
     """Analyze resource usage patterns"""
-    total_orders = len(customer_data)
-    avg_water = customer_data["Water_Litres"].sum() / total_orders
-    avg_electricity = customer_data["Electricity_kWh"].sum() / total_orders
-    
-    resource_usage = customer_data.groupby('StartDate').agg({
-        'Water_Litres': 'sum',
-        'Electricity_kWh': 'sum'
+    if daily is None:
+        daily = daily_totals(customer_data)
+    total_orders = daily["orders"].sum()
+    avg_water = daily["water"].sum() / total_orders
+    avg_electricity = daily["electricity"].sum() / total_orders
+    
+    resource_usage = daily[["water", "electricity"]].rename(columns={
+        'water': 'Water_Litres',
+        'electricity': 'Electricity_kWh'
     }).reset_index()
     
     return resource_usage, avg_water, avg_electricity
 
 def calculate_future_resource(forecast, avg_water, avg_electricity):
-    """Project future resource needs based on forecast"""
+    """Project future resource needs from the resource forecasts (flat per-order averages for older stored runs)"""
     forecast_period = forecast[forecast["ds"] > datetime.now()]
     future_resource = forecast_period.copy()
-    future_resource['Water_Needed'] = future_resource['yhat'] * avg_water
-    future_resource['Electricity_Needed'] = future_resource['yhat'] * avg_electricity
+    if "water_hat" in future_resource:
+        future_resource['Water_Needed'] = future_resource['water_hat']
+        future_resource['Electricity_Needed'] = future_resource['electricity_hat']
+    else:
+        future_resource['Water_Needed'] = future_resource['yhat'] * avg_water
+        future_resource['Electricity_Needed'] = future_resource['yhat'] * avg_electricity
     return future_resource
 
-def customer_section(df):
+def customer_section(df, tenant_index=None, daily_cube=None):
     """Main customer analysis section"""
     st.header("Customer Analysis")
     tenant_id = st.text_input("**Enter Customer ID:**", placeholder="e.g. T1")
@@ -231,12 +327,14 @@ def customer_section(df):
     if not tenant_id:
         return
         
-    customer_data = df[df["TenantID"] == tenant_id]
+    customer_data = drop_unused_categories(select_entity(df, "TenantID", tenant_id, tenant_index))
     
     if customer_data.empty:
         st.markdown(f'<div class="alert-box"><h3>⚠️ No data found for Customer ID: {tenant_id}</h3></div>', unsafe_allow_html=True)
         return
     
+    customer_daily = entity_daily(daily_cube, tenant_id) if daily_cube is not None else daily_totals(customer_data)
+    
     st.markdown(f'<div class="info-box"><p>🔍 Analyzing customer: {tenant_id}</p><p>📊 Found {len(customer_data)} historical orders</p></div>', unsafe_allow_html=True)
     
     # Subsection routing
@@ -247,11 +345,11 @@ def customer_section(df):
     if "Historical" in subsection:
         show_historical_analysis(customer_data)
     elif "Forecast" in subsection:
-        show_forecast_analysis(customer_data, tenant_id)
+        show_forecast_analysis(customer_data, tenant_id, customer_daily)
     elif "Resources" in subsection:
-        show_resource_analysis(customer_data, tenant_id)
+        show_resource_analysis(customer_data, tenant_id, customer_daily)
     elif "Report" in subsection:
-        show_business_report(customer_data, tenant_id)
+        show_business_report(customer_data, tenant_id, customer_daily)
 
 def show_historical_analysis(customer_data):
     """Display historical customer insights"""
@@ -265,12 +363,12 @@ def show_historical_analysis(customer_data):
     recent_orders = customer_data.sort_values("StartDate", ascending=False).head(5)
     st.dataframe(recent_orders[["StartDate", "Item", "Service", "Water_Litres", "Electricity_kWh"]])
 
-def show_forecast_analysis(customer_data, tenant_id):
+def show_forecast_analysis(customer_data, tenant_id, customer_daily=None):
     """Display demand forecast analysis"""
     st.subheader("Demand Forecasting")
     with st.spinner("Running demand forecast..."):
-        daily_orders = prepare_enhanced_data(customer_data)
-        actual, forecast = forecast_intermittent_demand(daily_orders, customer_data)
+        actual, forecast = cached_customer_forecast(tenant_id, load_dataset_version(), FORECAST_PARAMS,
+                                                    customer_data, customer_daily)
         
         if actual is None or forecast is None:
             st.error("Failed to generate forecast")
@@ -323,20 +421,20 @@ def show_forecast_analysis(customer_data, tenant_id):
         col3.markdown(f'<div class="metric-card"><div class="metric-title">Forecast Range</div><div class="metric-value">{forecast_period["yhat_lower"].mean():.2f} - {forecast_period["yhat_upper"].mean():.2f}</div></div>', 
                     unsafe_allow_html=True)
 
-def show_resource_analysis(customer_data, tenant_id):
+def show_resource_analysis(customer_data, tenant_id, customer_daily=None):
     """Display resource usage analysis"""
     st.subheader("Resource Usage Analysis")
     with st.spinner("Analyzing resource usage..."):
         # Prepare demand forecast first
-        daily_orders = prepare_enhanced_data(customer_data)
-        actual, forecast = forecast_intermittent_demand(daily_orders, customer_data)
+        actual, forecast = cached_customer_forecast(tenant_id, load_dataset_version(), FORECAST_PARAMS,
+                                                    customer_data, customer_daily)
         
         if actual is None or forecast is None:
             st.error("Failed to generate forecast")
             return
         
         # Get resource analysis
-        resource_usage, avg_water, avg_electricity = customer_resource_analysis(customer_data)
+        resource_usage, avg_water, avg_electricity = customer_resource_analysis(customer_data, customer_daily)
         future_resource = calculate_future_resource(forecast, avg_water, avg_electricity)
         
         # Display averages
@@ -410,12 +508,12 @@ def show_resource_analysis(customer_data, tenant_id):
         else:
             st.info("No future resource needs calculated")
 
-def show_business_report(customer_data, tenant_id):
+def show_business_report(customer_data, tenant_id, customer_daily=None):
     """Display comprehensive business report"""
     st.subheader("Business Intelligence Report")
     with st.spinner("Generating comprehensive report..."):
-        daily_orders = prepare_enhanced_data(customer_data)
-        actual, forecast = forecast_intermittent_demand(daily_orders, customer_data)
+        actual, forecast = cached_customer_forecast(tenant_id, load_dataset_version(), FORECAST_PARAMS,
+                                                    customer_data, customer_daily)
         
         if actual is None or forecast is None:
             st.error("Failed to generate forecast")
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+LAG_DAYS = [1, 7, 14, 28]
+# Mean orders over the N days before the forecast day (never including the day itself)
+ROLLING_WINDOWS = {"orders_7d_avg": 7, "orders_28d_avg": 28}
+
+def horizon_dates(last_date, periods):
+    """Daily dates following the last observed day"""
+    return pd.date_range(start=last_date + pd.Timedelta(days=1), periods=periods, freq='D')
+
+def calendar_features(dates, origin):
+    """Customer calendar features for a run of dates, built with whole-array operations
+
+    origin is the series start used for time_idx; pass one date per row to
+    build features for several series at once.
+    """
+    dates = pd.DatetimeIndex(dates)
+    origin = pd.DatetimeIndex(origin) if np.ndim(origin) else pd.Timestamp(origin)
+    day_of_week = np.asarray(dates.weekday)
+    return pd.DataFrame({
+        "day_of_week": day_of_week,
+        "is_weekend": (day_of_week >= 5).astype(int),
+        "month": np.asarray(dates.month),
+        "day_of_month": np.asarray(dates.day),
+        "time_idx": np.asarray((dates - origin).days),
+    })
+
+def laundry_calendar_features(dates):
+    """DayOfYear / DayOfWeek / WeekOfYear features used by the laundry forecaster"""
+    dates = pd.DatetimeIndex(dates)
+    return pd.DataFrame({
+        "DayOfYear": np.asarray(dates.dayofyear),
+        "DayOfWeek": np.asarray(dates.dayofweek),
+        "WeekOfYear": dates.isocalendar().week.to_numpy().astype(int),
+    })
+
+def last_observed_lags(daily_data):
+    """Lag and rolling-mean values for the day after the last observed one"""
+    orders = daily_data["orders"].to_numpy()
+    values = {name: orders[-window:].mean() if len(orders) else 0.0 for name, window in ROLLING_WINDOWS.items()}
+    for lag in LAG_DAYS:
+        values[f"lag_{lag}"] = orders[-lag] if len(orders) >= lag else 0
+    return values
+
+def future_feature_matrix(daily_data, future_dates, holidays, columns):
+    """Whole-horizon customer feature matrix with lags held at their last observed values"""
+    future_dates = pd.DatetimeIndex(future_dates)
+    features = calendar_features(future_dates, daily_data["ds"].min())
+    for name, value in last_observed_lags(daily_data).items():
+        features[name] = np.full(len(future_dates), value)
+    features["is_holiday"] = future_dates.isin(holidays).astype(int)
+    return features[list(columns)]
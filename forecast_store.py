@@ -0,0 +1,60 @@
+import json
+import os
+import pandas as pd
+from atomic_io import atomic_write
+
+STORE_DIR = "forecasts"
+# Rows per Parquet row group: with the store sorted by entity, a lookup reads only the groups holding that entity
+STORE_ROW_GROUP_SIZE = 4096
+
+def _store_paths(kind, store_dir):
+    return (os.path.join(store_dir, f"{kind}_forecasts.parquet"),
+            os.path.join(store_dir, f"{kind}_forecasts.meta.json"))
+
+def save_forecasts(forecasts, kind, meta, store_dir=STORE_DIR):
+    """Atomically write a batch of precomputed forecasts and the run metadata
+
+    The first column is the entity id; rows are sorted by it so per-entity
+    reads can skip the rest of the file.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    parquet_path, meta_path = _store_paths(kind, store_dir)
+    forecasts = forecasts.sort_values(forecasts.columns[0], kind="stable")
+    atomic_write(parquet_path, lambda f: forecasts.to_parquet(f, index=False, row_group_size=STORE_ROW_GROUP_SIZE))
+    atomic_write(meta_path, lambda f: f.write(json.dumps(meta, default=str).encode()))
+    return parquet_path
+
+def load_forecast_meta(kind, store_dir=STORE_DIR):
+    """Metadata of the last batch run, or None"""
+    _, meta_path = _store_paths(kind, store_dir)
+    try:
+        with open(meta_path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def load_forecasts(kind, store_dir=STORE_DIR, filters=None):
+    """Stored forecasts of a kind (optionally filtered, pushed down to the Parquet reader), or None when no batch has run"""
+    parquet_path, _ = _store_paths(kind, store_dir)
+    try:
+        return pd.read_parquet(parquet_path, filters=filters)
+    except (FileNotFoundError, ImportError):
+        return None
+
+def stored_forecast(kind, entity_column, entity_id, data_version, params, horizon, store_dir=STORE_DIR,
+                    meta_match=None):
+    """One entity's stored forecast if it was built from the same data and params
+
+    meta_match holds any further run settings (e.g. forecast mode) that must
+    equal the values recorded by the batch job.
+    """
+    meta = load_forecast_meta(kind, store_dir)
+    if (meta is None or meta.get("data_version") != data_version
+            or meta.get("params") != params or meta.get("horizon", 0) < horizon):
+        return None
+    if any(meta.get(key) != value for key, value in (meta_match or {}).items()):
+        return None
+    forecast = load_forecasts(kind, store_dir, filters=[(entity_column, "==", entity_id)])
+    if forecast is None or forecast.empty:
+        return None
+    return forecast.drop(columns=[entity_column]).head(horizon).reset_index(drop=True)
@@ -0,0 +1,251 @@
+import logging
+import numpy as np
+import pandas as pd
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+from features import LAG_DAYS, ROLLING_WINDOWS, horizon_dates, calendar_features
+
+logger = logging.getLogger(__name__)
+
+TREE_METHODS = ["rf", "xgb"]
+# Histogram-based boosting, using every core
+XGB_PARAMS = {
+    "n_estimators": 300,
+    "max_depth": 4,
+    "learning_rate": 0.05,
+    "subsample": 0.8,
+    "tree_method": "hist",
+    "n_jobs": -1,
+    "random_state": 42,
+}
+
+# Daily usage totals forecast alongside orders: tree models are fitted on
+# [orders, *RESOURCE_TARGETS] and predict all of them in one call
+RESOURCE_TARGETS = ["water", "electricity"]
+
+HISTORY_WINDOW = max(max(LAG_DAYS), max(ROLLING_WINDOWS.values()))
+
+def xgb_regressor(**params):
+    """XGBRegressor, imported lazily so xgboost stays an optional dependency"""
+    from xgboost import XGBRegressor
+    return XGBRegressor(**params)
+
+class OrdersResourceRegressor:
+    """Orders and RESOURCE_TARGETS behind one fit/predict, from two tree models
+
+    A single multi-output forest picks splits by the squared error summed over
+    every target, which lets water (litres) drown out orders. Orders keep a
+    model of their own, so they forecast exactly as an orders-only model; the
+    resources share a second one fitted on standardized targets. y and the
+    predictions are (rows, [orders, *RESOURCE_TARGETS]).
+    """
+
+    def __init__(self, orders_model, resource_model):
+        self.orders_model = orders_model
+        self.resource_model = TransformedTargetRegressor(regressor=resource_model, transformer=StandardScaler(),
+                                                         check_inverse=False)
+
+    def fit(self, X, y):
+        y = np.asarray(y, dtype=float)
+        self.orders_model.fit(X, y[:, 0])
+        self.resource_model.fit(X, y[:, 1:])
+        return self
+
+    def predict(self, X):
+        return np.column_stack([self.orders_model.predict(X), self.resource_model.predict(X)])
+
+def orders_resource_model(make_model):
+    """Constructor of an OrdersResourceRegressor whose two models are make_model(**params)"""
+    def make(**params):
+        return OrdersResourceRegressor(make_model(**params), make_model(**params))
+    return make
+
+def tree_model_factory(backend, rf_params):
+    """Model constructor and params for a tree backend ("rf" or "xgb")"""
+    if backend == "xgb":
+        return orders_resource_model(xgb_regressor), XGB_PARAMS
+    return orders_resource_model(RandomForestRegressor), rf_params
+
+def orders_regressor(model):
+    """The model that forecasts orders: the orders half of an OrdersResourceRegressor, or the model itself"""
+    return getattr(model, "orders_model", model)
+
+def split_outputs(pred):
+    """Orders forecast and {"<resource>_hat": forecast} from a multi-output prediction"""
+    pred = np.maximum(0, np.asarray(pred))
+    if pred.ndim == 1:
+        return pred, {}
+    return pred[:, 0], {f"{name}_hat": pred[:, i + 1] for i, name in enumerate(RESOURCE_TARGETS)}
+
+def per_order_resources(orders, usage, yhat):
+    """Resource forecasts scaled from historical usage per order, for models that only forecast orders"""
+    total_orders = float(np.sum(orders))
+    return {
+        f"{name}_hat": yhat * (float(np.sum(usage[name])) / total_orders if total_orders else 0.0)
+        for name in RESOURCE_TARGETS
+    }
+
+def recursive_forecast(model, daily_frames, horizon, columns, holidays=None):
+    """Recursive multi-step forecast for series that share one model
+
+    Each step's prediction is fed back into the lag and rolling-mean features
+    of the next step. All series are predicted together, one predict call per
+    step. Rolling means use the values known before the predicted day; a
+    multi-output model feeds back its first (orders) output.
+    Returns (future_dates per series, predictions of shape (series, horizon),
+    the feature rows used, stacked step by step) so callers can derive
+    intervals for the whole horizon in one pass.
+    """
+    n_series = len(daily_frames)
+    holidays = holidays if holidays is not None else [()] * n_series
+    future_dates = [horizon_dates(frame["ds"].max(), horizon) for frame in daily_frames]
+
+    # Calendar and holiday features do not depend on predictions: build them for every step up front
+    flat_dates = pd.DatetimeIndex(np.concatenate([dates.values for dates in future_dates]))
+    origins = np.repeat([frame["ds"].min() for frame in daily_frames], horizon)
+    calendar = calendar_features(flat_dates, origins)
+    calendar["is_holiday"] = np.concatenate([
+        dates.isin(series_holidays).astype(int) for dates, series_holidays in zip(future_dates, holidays)
+    ])
+    calendar = {name: values.to_numpy().reshape(n_series, horizon) for name, values in calendar.items()}
+
+    # Rolling buffer: last HISTORY_WINDOW observations per series (NaN-padded), then the predictions
+    buffer = np.full((n_series, HISTORY_WINDOW + horizon), np.nan)
+    for i, frame in enumerate(daily_frames):
+        history = frame["orders"].to_numpy(dtype=float)[-HISTORY_WINDOW:]
+        buffer[i, HISTORY_WINDOW - len(history):HISTORY_WINDOW] = history
+
+    predictions = np.empty((n_series, horizon))
+    step_frames = []
+    for step in range(horizon):
+        end = HISTORY_WINDOW + step
+        step_features = {name: values[:, step] for name, values in calendar.items()}
+        for name, window in ROLLING_WINDOWS.items():
+            recent = buffer[:, end - window:end]
+            counts = np.sum(~np.isnan(recent), axis=1)
+            step_features[name] = np.where(counts > 0, np.nansum(recent, axis=1) / np.maximum(counts, 1), 0.0)
+        for lag in LAG_DAYS:
+            step_features[f"lag_{lag}"] = np.nan_to_num(buffer[:, end - lag])
+        X_step = pd.DataFrame({name: step_features[name] for name in columns})
+        step_pred, _ = split_outputs(model.predict(X_step))
+        predictions[:, step] = step_pred
+        buffer[:, end] = step_pred
+        step_frames.append(X_step)
+
+    return future_dates, predictions, pd.concat(step_frames, ignore_index=True)
+
+INTERVAL_QUANTILES = (10, 90)
+
+def forest_leaf_values(model):
+    """(n_trees, max_nodes) table of every tree's node predictions, NaN-padded"""
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    table = np.full((len(trees), max(tree.node_count for tree in trees)), np.nan)
+    for i, tree in enumerate(trees):
+        table[i, :tree.node_count] = tree.value[:, 0, 0]
+    return table
+
+def forest_quantile_intervals(model, X, quantiles=INTERVAL_QUANTILES):
+    """Empirical prediction interval from the spread of a forest's per-tree predictions
+
+    One apply() call gives every tree's leaf for every row; gathering the leaf
+    values yields an (n_rows, n_trees) matrix reduced with vectorized percentiles.
+    Bounds are for orders.
+    """
+    forest = orders_regressor(model)
+    leaves = forest.apply(X)
+    per_tree = forest_leaf_values(forest)[np.arange(leaves.shape[1]), leaves]
+    lower, upper = np.percentile(per_tree, quantiles, axis=1)
+    return lower, upper
+
+def has_tree_intervals(model):
+    """Whether per-tree predictions are meaningful on their own (bagged forests, not boosting)"""
+    forest = orders_regressor(model)
+    return hasattr(forest, "estimators_") and hasattr(forest, "apply")
+
+INTERMITTENT_METHODS = ["croston", "sba", "tsb"]
+
+def _ses_level(values, alpha):
+    """Final simple-exponential-smoothing level, in closed form as a weighted sum"""
+    n = len(values)
+    if n == 0:
+        return 0.0
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (n - 1)  # the level is initialised with the first value
+    return float(np.dot(weights, values))
+
+def average_demand_interval(y):
+    """Mean number of periods between non-zero demands"""
+    y = np.asarray(y, dtype=float)
+    nonzero = np.count_nonzero(y)
+    return len(y) / nonzero if nonzero else np.inf
+
+def intermittent_demand_level(y, method="sba", alpha=0.1, beta=0.1):
+    """Per-period demand rate from Croston, SBA or TSB, O(n) with no fitting loop"""
+    if method not in INTERMITTENT_METHODS:
+        raise ValueError(f"Unknown intermittent demand method: {method}")
+    y = np.asarray(y, dtype=float)
+    nonzero_idx = np.flatnonzero(y)
+    if len(nonzero_idx) == 0:
+        return 0.0
+    size = _ses_level(y[nonzero_idx], alpha)
+
+    if method == "tsb":
+        # TSB smooths the occurrence probability every period, so it decays after demand stops
+        probability = _ses_level((y > 0).astype(float), beta)
+        return size * probability
+
+    intervals = np.diff(np.concatenate([[-1], nonzero_idx]))
+    interval = _ses_level(intervals.astype(float), alpha)
+    level = size / interval
+    if method == "sba":
+        level *= 1 - alpha / 2
+    return level
+
+
+SEASON_LENGTH = 7
+SIMPLE_METHODS = ["seasonal_naive", "ses"]
+# Routes calibrated on the rolling backtest (backtest.py, 6 cutoffs x 14 days, rf/ses/seasonal_naive/sba/tsb):
+# SBA had the lowest MAE on 9 of 10 laundries and 87 of 100 tenants, and no series profile (length, zero
+# ratio, ADI, CV) separated the rest; rf was 1.04-2.4x the best cheap method's MAE on every series. A
+# short-history holdout check picked worse models than SBA alone. Re-run the backtest when the fleet changes.
+ROUTE_DEFAULT = "sba"
+# Below this many days only a level can be estimated
+ROUTE_MIN_HISTORY = SEASON_LENGTH
+
+def series_profile(y):
+    """Length, sparsity and variability statistics logged with each routing decision"""
+    y = np.asarray(y, dtype=float)
+    mean = y.mean() if len(y) else 0.0
+    return {
+        "length": len(y),
+        "zero_ratio": float(np.mean(y == 0)) if len(y) else 1.0,
+        "adi": average_demand_interval(y),
+        "cv": float(y.std() / mean) if mean > 0 else 0.0,
+    }
+
+def route_series(y):
+    """Pick the cheapest adequate model for a gap-filled daily series"""
+    profile = series_profile(y)
+    route = "ses" if profile["length"] < ROUTE_MIN_HISTORY else ROUTE_DEFAULT
+    return route, profile
+
+def simple_forecast(y, horizon, method, alpha=0.3):
+    """Point forecast from a non-forest method: seasonal naive, SES or an intermittent method"""
+    if method not in SIMPLE_METHODS + INTERMITTENT_METHODS:
+        raise ValueError(f"Unknown simple forecast method: {method}")
+    y = np.asarray(y, dtype=float)
+    if len(y) == 0:
+        return np.zeros(horizon)
+    if method == "seasonal_naive":
+        # y[-SEASON_LENGTH] falls on the same weekday as the first forecast day
+        return np.resize(y[-SEASON_LENGTH:], horizon)
+    if method == "ses":
+        return np.full(horizon, _ses_level(y, alpha))
+    return np.full(horizon, intermittent_demand_level(y, method))
+
+def log_route(entity_id, route, profile, seconds):
+    """Record a routing decision and how long the chosen model took"""
+    logger.info("forecast route entity=%s route=%s length=%d zero_ratio=%.2f adi=%.2f cv=%.2f fit_ms=%.1f",
+                entity_id, route, profile["length"], profile["zero_ratio"], profile["adi"], profile["cv"],
+                seconds * 1000)
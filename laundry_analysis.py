@@ -4,99 +4,293 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import seaborn as sns
-from sklearn.ensemble import RandomForestRegressor, IsolationForest
-from sklearn.linear_model import LinearRegression
 from datetime import datetime
+import hashlib
+import time
+from alert_rules import evaluate_alerts
+from features import horizon_dates, laundry_calendar_features
+from forecast_store import stored_forecast
+from forecasting import (route_series, series_profile, simple_forecast, log_route, tree_model_factory, TREE_METHODS,
+                         forest_quantile_intervals, has_tree_intervals, RESOURCE_TARGETS, split_outputs,
+                         per_order_resources)
+from model_registry import fit_or_load
+from notifications import Dispatcher, enqueue, parse_recipients, outbox_status
+from order_anomalies import build_order_baselines, score_orders, ORDER_ANOMALY_Z
+from resource_monitor import score_fleet, scan_fleet, ANOMALY_Z
+from resources import load_dataset_version, select_entity, daily_totals, entity_daily, build_daily_cube
 
-def prepare_laundry_data(df, laundry_id):
+LAUNDRY_FORECAST_PARAMS = {"n_estimators": 100, "random_state": 42}
+LAUNDRY_FEATURES = ['DayOfYear', 'DayOfWeek', 'WeekOfYear']
+GLOBAL_FEATURES = LAUNDRY_FEATURES + ['LaundryCode', 'CountryCode', 'CityCode']
+# Orders ('y') and daily resource totals, predicted together (see forecasting.OrdersResourceRegressor)
+LAUNDRY_TARGETS = ['y'] + RESOURCE_TARGETS
+LAUNDRY_FORECAST_DAYS = 30
+LAUNDRY_FORECAST_CACHE_SIZE = 64
+# "auto" routes each laundry to the cheapest adequate model; or force "rf", "xgb", "seasonal_naive", "ses", ...
+# "global" serves every laundry from one cross-fleet model (see forecast_fleet_global)
+LAUNDRY_FORECAST_METHOD = "auto"
+# Half-width of the forecast band for models without per-tree spread
+LAUNDRY_BAND_WIDTH = 1.5
+
+def _forecast_band(yhat, model=None, X=None):
+    """(lower, upper) bounds: forest quantiles when the model has them, else yhat ± LAUNDRY_BAND_WIDTH"""
+    if model is not None and has_tree_intervals(model):
+        return forest_quantile_intervals(model, X)
+    return yhat - LAUNDRY_BAND_WIDTH, yhat + LAUNDRY_BAND_WIDTH
+
+def laundry_daily_totals(df, laundry_id, laundry_index=None, daily_cube=None):
+    """Per-day totals for one laundry, read from the cube when available"""
+    if daily_cube is not None:
+        return entity_daily(daily_cube, laundry_id)
+    return daily_totals(select_entity(df, 'LaundryID', laundry_id, laundry_index))
+
+def prepare_laundry_data(df, laundry_id, laundry_index=None, daily_cube=None):
     """Prepare laundry-specific time series data"""
-    laundry_df = df[df['LaundryID'] == laundry_id].copy()
-    daily_demand = laundry_df.groupby('StartDate').size().reset_index(name='y')
+    daily = laundry_daily_totals(df, laundry_id, laundry_index, daily_cube)
+    daily_demand = daily[['orders'] + RESOURCE_TARGETS].rename(columns={'orders': 'y'}).reset_index()
     daily_demand = daily_demand.rename(columns={"StartDate": "ds"})
     daily_demand["ds"] = pd.to_datetime(daily_demand["ds"])
     return daily_demand
 
-def forecast_demand_laundry_rf(daily_data, forecast_days=14):
-    """Forecast laundry demand using Random Forest"""
-    data = daily_data.copy()
-    data['DayOfYear'] = data['ds'].dt.dayofyear
-    data['DayOfWeek'] = data['ds'].dt.dayofweek
-    data['WeekOfYear'] = data['ds'].dt.isocalendar().week.astype(int)
+def forecast_demand_laundry_rf(daily_data, forecast_days=14, model_params=None, entity_id=None, backend="rf"):
+    """Forecast laundry demand using Random Forest (or XGBoost with backend="xgb")
 
-    X = data[['DayOfYear', 'DayOfWeek', 'WeekOfYear']]
-    y = data['y']
+    model_params configures the forest; XGBoost uses forecasting.XGB_PARAMS.
+    Water and electricity are forecast by the same model in the same predict
+    call (water_hat / electricity_hat).
+    """
+    data = daily_data.reset_index(drop=True)
+    data = pd.concat([data, laundry_calendar_features(data['ds'])], axis=1)
 
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X, y)
+    X = data[LAUNDRY_FEATURES]
+    y = data[LAUNDRY_TARGETS]
 
-    last_date = data['ds'].max()
-    future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=forecast_days)
-    future_df = pd.DataFrame({"ds": future_dates})
-    future_df['DayOfYear'] = future_df['ds'].dt.dayofyear
-    future_df['DayOfWeek'] = future_df['ds'].dt.dayofweek
-    future_df['WeekOfYear'] = future_df['ds'].dt.isocalendar().week.astype(int)
+    make_model, params = tree_model_factory(backend, model_params or LAUNDRY_FORECAST_PARAMS)
+    if entity_id is None:
+        model = make_model(**params)
+        model.fit(X, y)
+    else:
+        model = fit_or_load(f"laundry_{backend}", entity_id, LAUNDRY_FEATURES + LAUNDRY_TARGETS, make_model, params,
+                            X, y)
 
-    yhat = model.predict(future_df[['DayOfYear', 'DayOfWeek', 'WeekOfYear']])
+    future_dates = horizon_dates(data['ds'].max(), forecast_days)
+    future_df = pd.concat([pd.DataFrame({"ds": future_dates}), laundry_calendar_features(future_dates)], axis=1)
+
+    yhat, resources = split_outputs(model.predict(future_df[LAUNDRY_FEATURES]))
     future_df['yhat'] = yhat
-    future_df['yhat_lower'] = yhat - 1.5
-    future_df['yhat_upper'] = yhat + 1.5
+    future_df['yhat_lower'], future_df['yhat_upper'] = _forecast_band(yhat, model, future_df[LAUNDRY_FEATURES])
+    future_df = future_df.assign(**resources)
 
     return data, model, future_df
 
-def laundry_resource_analysis(df, laundry_id):
+def forecast_laundry_demand(daily_data, forecast_days=14, model_params=None, entity_id=None,
+                            method=LAUNDRY_FORECAST_METHOD):
+    """Forecast laundry demand with the forest or a cheaper model chosen by routing"""
+    # Days without orders are missing from daily_data; route on the gap-filled series
+    y = daily_data.set_index('ds')['y'].asfreq('D', fill_value=0)
+    if method == "auto":
+        method, profile = route_series(y)
+    else:
+        profile = series_profile(y)
+
+    start = time.perf_counter()
+    if method in TREE_METHODS:
+        data, model, future_df = forecast_demand_laundry_rf(daily_data, forecast_days, model_params, entity_id,
+                                                            backend=method)
+    else:
+        data, model = daily_data, None
+        yhat = simple_forecast(y, forecast_days, method)
+        future_df = pd.DataFrame({"ds": horizon_dates(y.index.max(), forecast_days), "yhat": yhat})
+        future_df['yhat_lower'], future_df['yhat_upper'] = _forecast_band(yhat)
+        future_df = future_df.assign(**per_order_resources(daily_data['y'], daily_data, np.maximum(0, yhat)))
+    log_route(entity_id, method, profile, time.perf_counter() - start)
+
+    return data, model, future_df
+
+def stable_codes(values):
+    """Integer code per value derived from the value itself, so adding sites never renumbers existing ones
+
+    24 bits keeps every code exact in the float32 matrices the tree models train on.
+    """
+    return np.array([int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=3).digest(), 'big')
+                     for value in values])
+
+def laundry_sites(df):
+    """Identity and primary-location codes per laundry, used as global model features"""
+    primary = df.groupby('LaundryID', observed=True)[['Country', 'City']].agg(lambda s: s.value_counts().idxmax())
+    primary.index = primary.index.astype(str)
+    return pd.DataFrame({
+        'LaundryCode': stable_codes(primary.index),
+        'CountryCode': stable_codes(primary['Country']),
+        'CityCode': stable_codes(primary['Country'].astype(str) + '/' + primary['City'].astype(str)),
+    }, index=primary.index)
+
+def _with_site_features(frame, sites):
+    calendar = laundry_calendar_features(frame['ds'])
+    codes = sites.loc[frame['LaundryID']].reset_index(drop=True)
+    return pd.concat([frame.reset_index(drop=True), calendar, codes], axis=1)
+
+def forecast_fleet_global(df, daily_cube=None, forecast_days=LAUNDRY_FORECAST_DAYS, model_params=None, backend="rf"):
+    """Forecast every laundry from one model trained on the whole fleet
+
+    Laundry identity and location are features, so sites share what they have
+    in common and a new laundry is forecast from its first day of data. The
+    whole horizon is predicted in one batched call.
+    """
+    if daily_cube is None:
+        daily_cube = build_daily_cube(df, 'LaundryID')
+    sites = laundry_sites(df)
+
+    history = daily_cube[['orders'] + RESOURCE_TARGETS].rename(columns={'orders': 'y'}).reset_index()
+    history = history.rename(columns={'StartDate': 'ds'})
+    history['LaundryID'] = history['LaundryID'].astype(str)
+    # Date-ordered, so a day of new data appends rows and the registry can extend the model
+    history = history.sort_values(['ds', 'LaundryID'], kind='stable', ignore_index=True)
+    train = _with_site_features(history, sites)
+
+    make_model, params = tree_model_factory(backend, model_params or LAUNDRY_FORECAST_PARAMS)
+    model = fit_or_load(f"laundry_global_{backend}", "fleet", GLOBAL_FEATURES + LAUNDRY_TARGETS, make_model, params,
+                        train[GLOBAL_FEATURES], train[LAUNDRY_TARGETS])
+
+    last_dates = history.groupby('LaundryID')['ds'].max()
+    steps = pd.to_timedelta(np.tile(np.arange(1, forecast_days + 1), len(last_dates)), unit='D')
+    future = pd.DataFrame({
+        'LaundryID': np.repeat(last_dates.index.to_numpy(), forecast_days),
+        'ds': np.repeat(last_dates.to_numpy(), forecast_days) + steps,
+    })
+    future = _with_site_features(future, sites)
+
+    yhat, resources = split_outputs(model.predict(future[GLOBAL_FEATURES]))
+    forecasts = future[['LaundryID', 'ds']].copy()
+    forecasts['yhat'] = yhat
+    forecasts['yhat_lower'], forecasts['yhat_upper'] = _forecast_band(yhat, model, future[GLOBAL_FEATURES])
+    return model, forecasts.assign(**resources)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_fleet_forecast(data_version, model_params, forecast_days=LAUNDRY_FORECAST_DAYS, _df=None, _daily_cube=None):
+    """Global-model forecasts for the whole fleet, computed once per data version"""
+    _, forecasts = forecast_fleet_global(_df, _daily_cube, forecast_days, model_params)
+    return forecasts
+
+@st.cache_data(max_entries=LAUNDRY_FORECAST_CACHE_SIZE, show_spinner=False)
+def cached_laundry_forecast(laundry_id, data_version, model_params, forecast_days=LAUNDRY_FORECAST_DAYS,
+                            _df=None, _laundry_index=None, _daily_cube=None, method=LAUNDRY_FORECAST_METHOD):
+    """Daily history and forecast for a laundry, trained once per laundry and data version"""
+    daily = prepare_laundry_data(_df, laundry_id, _laundry_index, _daily_cube)
+    if daily.empty:
+        return daily, None
+    forecast = stored_forecast("laundry", "LaundryID", laundry_id, data_version, model_params, forecast_days,
+                               meta_match={"method": method})
+    if forecast is not None:
+        return daily, forecast
+    if method == "global":
+        fleet = cached_fleet_forecast(data_version, model_params, forecast_days, _df=_df, _daily_cube=_daily_cube)
+        forecast = fleet[fleet['LaundryID'] == laundry_id].drop(columns=['LaundryID']).reset_index(drop=True)
+        return daily, forecast
+    daily, _, forecast = forecast_laundry_demand(daily, forecast_days, model_params, entity_id=laundry_id,
+                                                 method=method)
+    return daily, forecast
+
+def laundry_resource_analysis(df, laundry_id, laundry_index=None, daily_cube=None):
     """Analyze resource consumption patterns"""
-    laundry_df = df[df['LaundryID'] == laundry_id].copy()
+    daily = laundry_daily_totals(df, laundry_id, laundry_index, daily_cube)
     
-    daily_usage = laundry_df.groupby(["StartDate"]).agg({
-        "TenantID": "count",
-        "Water_Litres": "sum",
-        "Electricity_kWh": "sum"
-    }).reset_index()
+    daily_usage = daily[["orders", "water", "electricity"]].reset_index()
     
     daily_usage = daily_usage.rename(columns={
-        "TenantID": "OrderCount",
-        "Water_Litres": "WaterConsumption",
-        "Electricity_kWh": "ElectricityConsumption"
+        "orders": "OrderCount",
+        "water": "WaterConsumption",
+        "electricity": "ElectricityConsumption"
     })
     
-    X = daily_usage[["OrderCount"]]
-    daily_usage["ExpectedWater"] = LinearRegression().fit(X, daily_usage["WaterConsumption"]).predict(X)
-    daily_usage["ExpectedElectricity"] = LinearRegression().fit(X, daily_usage["ElectricityConsumption"]).predict(X)
-    
-    daily_usage["WaterError"] = daily_usage["WaterConsumption"] - daily_usage["ExpectedWater"]
-    daily_usage["ElectricError"] = daily_usage["ElectricityConsumption"] - daily_usage["ExpectedElectricity"]
-    
-    model = IsolationForest(contamination=0.05, random_state=42)
-    daily_usage["Anomaly"] = model.fit_predict(daily_usage[["WaterError", "ElectricError"]])
+    # Each day is scored by the streaming monitor against the days before it; the fleet is scored once per version
+    scores = cached_resource_scores(load_dataset_version(), _df=df, _daily_cube=daily_cube)
+    scores = laundry_scores(scores, laundry_id).reindex(daily_usage["StartDate"])
+    daily_usage["ExpectedWater"] = scores["expected_water"].to_numpy()
+    daily_usage["ExpectedElectricity"] = scores["expected_electricity"].to_numpy()
+    daily_usage["WaterError"] = scores["error_water"].to_numpy()
+    daily_usage["ElectricError"] = scores["error_electricity"].to_numpy()
+    daily_usage["AnomalyScore"] = scores["z"].to_numpy()
+    daily_usage["Anomaly"] = np.where(scores["anomaly"].to_numpy(), -1, 1)
     daily_usage["AnomalyLabel"] = daily_usage["Anomaly"].map({1: "Normal", -1: "Anomaly"})
     
-    def check_alerts(row):
-        if row["Anomaly"] == -1 and row["OrderCount"] < 5:
-            return "🚨 Alert: High usage on low order day"
-        return "✅ Normal"
-    
-    daily_usage["Alert"] = daily_usage.apply(check_alerts, axis=1)
+    daily_usage["Alert"] = evaluate_alerts(daily_usage, entities=str(laundry_id))
     
     return daily_usage
 
-def detect_low_demand_days(df, laundry_id, threshold=5):
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_resource_scores(data_version, _df=None, _daily_cube=None):
+    """Streaming-monitor scores of every laundry-day, indexed by (LaundryID, StartDate), once per data version"""
+    daily_cube = _daily_cube if _daily_cube is not None else build_daily_cube(_df, 'LaundryID')
+    scores = score_fleet(daily_cube)
+    scores['LaundryID'] = scores['LaundryID'].astype(str)
+    return scores.set_index(['LaundryID', 'StartDate']).sort_index()
+
+def laundry_scores(scores, laundry_id):
+    """One laundry's rows of cached_resource_scores, indexed by date"""
+    try:
+        return scores.xs(str(laundry_id), level='LaundryID')
+    except KeyError:
+        return scores.iloc[0:0].droplevel('LaundryID')
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_fleet_scan(data_version, _df=None, _daily_cube=None):
+    """Fleet-wide resource anomaly ranking, computed once per data version from the cached fleet scores"""
+    scores = cached_resource_scores(data_version, _df=_df, _daily_cube=_daily_cube)
+    return scan_fleet(scores=scores.reset_index())
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_order_baselines(data_version, _df=None):
+    """(Service, Item, LaundryID) usage baselines, built once per data version"""
+    return build_order_baselines(_df)
+
+def order_resource_anomalies(df, laundry_id, laundry_index=None):
+    """One laundry's orders scored against their per (Service, Item) baselines, worst first"""
+    orders = select_entity(df, 'LaundryID', laundry_id, laundry_index)
+    scored = score_orders(orders, cached_order_baselines(load_dataset_version(), _df=df))
+    return scored.sort_values("order_z", ascending=False)
+
+def detect_low_demand_days(df, laundry_id, threshold=5, laundry_index=None, daily_cube=None, horizon=7):
     """Identify days with expected low demand"""
-    daily = prepare_laundry_data(df, laundry_id)
+    daily, forecast = cached_laundry_forecast(laundry_id, load_dataset_version(), LAUNDRY_FORECAST_PARAMS,
+                                              _df=df, _laundry_index=laundry_index, _daily_cube=daily_cube)
     
-    if daily.empty:
+    if forecast is None:
         return None, None
     
-    daily, model, forecast = forecast_demand_laundry_rf(daily, forecast_days=7)
+    # Every routed model is horizon-consistent, so the first days of the shared 30-day fit match a short-horizon fit
+    forecast = forecast.head(horizon)
     low_demand = forecast[forecast["yhat"] < threshold]
     
     return forecast, low_demand
 
-def laundry_section(df):
+@st.cache_resource
+def load_notification_dispatcher():
+    """Background thread that delivers queued alerts, shared by all sessions"""
+    dispatcher = Dispatcher()
+    dispatcher.start()
+    return dispatcher
+
+def queue_peak_alerts(laundry_id, peak_days, recipients_text, message):
+    """Queue the peak-day alert for every recipient and wake the dispatcher; returns (queued, recipients, rejected)"""
+    recipients, rejected = parse_recipients(recipients_text)
+    if not recipients:
+        return 0, recipients, rejected
+    lines = [f"{day:%Y-%m-%d}: {orders:.1f} expected orders" for day, orders in zip(peak_days["ds"], peak_days["yhat"])]
+    body = message + "\n\n" + "\n".join(lines)
+    queued = enqueue(recipients, f"Peak demand alert: Laundry {laundry_id}", body)
+    load_notification_dispatcher().wake()
+    return queued, recipients, rejected
+
+def laundry_section(df, laundry_index=None, daily_cube=None):
     """Main laundry analysis section"""
     st.header("Laundry Analysis")
+    # Started on boot so messages left pending or backing off by a restart are resumed
+    load_notification_dispatcher()
     laundry_id = st.text_input("**Enter Laundry ID:**", placeholder="e.g. L3")
     
     if not laundry_id:
+        show_fleet_scan(df, daily_cube)
         return
     
     # Subsection routing
@@ -105,26 +299,53 @@ def laundry_section(df):
                                  horizontal=True)
     
     if "Forecast" in subsection:
-        show_peak_forecast(df, laundry_id)
+        show_peak_forecast(df, laundry_id, laundry_index, daily_cube)
     elif "Alerts" in subsection:
-        show_peak_alerts(df, laundry_id)
+        show_peak_alerts(df, laundry_id, laundry_index, daily_cube)
     elif "Resources" in subsection:
-        show_resource_analysis(df, laundry_id)
+        show_resource_analysis(df, laundry_id, laundry_index, daily_cube)
+
+def show_fleet_scan(df, daily_cube=None):
+    """Rank every laundry by resource anomalies so leaks surface without entering IDs"""
+    with st.expander("🔎 Fleet Resource Scan", expanded=True):
+        with st.spinner("Scanning the fleet..."):
+            offenders, worst_days = cached_fleet_scan(load_dataset_version(), _df=df, _daily_cube=daily_cube)
+        
+        flagged = offenders[offenders["anomaly_days"] > 0]
+        if flagged.empty:
+            st.markdown(f'<div class="success-box"><h3>✅ No resource anomalies (score > {ANOMALY_Z}) across the fleet</h3></div>',
+                        unsafe_allow_html=True)
+            return
+        
+        st.markdown(f'<div class="alert-box"><h3>🚨 {len(flagged)} laundries with resource anomalies</h3></div>',
+                    unsafe_allow_html=True)
+        st.markdown("### Worst Offenders")
+        st.dataframe(flagged.assign(last_anomaly=flagged["last_anomaly"].dt.strftime('%Y-%m-%d')).rename(columns={
+            "days": "Days", "anomaly_days": "Anomaly Days", "anomaly_rate": "Anomaly Rate",
+            "max_z": "Peak Score", "excess_water": "Excess Water (L)",
+            "excess_electricity": "Excess Electricity (kWh)", "last_anomaly": "Last Anomaly"
+        }).round(2))
+        
+        st.markdown("### Most Anomalous Days")
+        st.dataframe(worst_days.assign(StartDate=worst_days["StartDate"].dt.strftime('%Y-%m-%d')).rename(columns={
+            "StartDate": "Date", "orders": "Orders", "water": "Water (L)", "electricity": "Electricity (kWh)",
+            "expected_water": "Expected Water", "expected_electricity": "Expected Electricity", "z": "Score"
+        })[["LaundryID", "Date", "Orders", "Water (L)", "Expected Water", "Electricity (kWh)",
+            "Expected Electricity", "Score"]].round(2))
 
-def show_peak_forecast(df, laundry_id):
+def show_peak_forecast(df, laundry_id, laundry_index=None, daily_cube=None):
     """Display peak demand forecast"""
     st.subheader("Peak Days Forecast")
     peak_threshold = st.slider("Set Peak Threshold", 1, 20, 5, key="peak_threshold")
     
     with st.spinner("Forecasting laundry demand..."):
-        daily = prepare_laundry_data(df, laundry_id)
+        daily, forecast = cached_laundry_forecast(laundry_id, load_dataset_version(), LAUNDRY_FORECAST_PARAMS,
+                                                  _df=df, _laundry_index=laundry_index, _daily_cube=daily_cube)
         
         if daily.empty:
             st.markdown(f'<div class="alert-box"><h3>⚠️ No data found for Laundry ID: {laundry_id}</h3></div>', unsafe_allow_html=True)
             return
         
-        daily, model, forecast = forecast_demand_laundry_rf(daily, forecast_days=30)
-        
         fig, ax = plt.subplots(figsize=(10, 5))
         
         ax.plot(daily["ds"], daily["y"], 'o-', label="Actual Demand", color='#1a1a2e', markersize=4)
@@ -147,19 +368,19 @@ def show_peak_forecast(df, laundry_id):
         
         st.pyplot(fig)
 
-def show_peak_alerts(df, laundry_id):
+def show_peak_alerts(df, laundry_id, laundry_index=None, daily_cube=None):
     """Display peak demand alerts"""
     st.subheader("Peak Days Alert System")
     peak_threshold = st.slider("Set Alert Threshold", 1, 20, 8, key="alert_threshold")
     
     with st.spinner("Analyzing peak days..."):
-        daily = prepare_laundry_data(df, laundry_id)
+        daily, forecast = cached_laundry_forecast(laundry_id, load_dataset_version(), LAUNDRY_FORECAST_PARAMS,
+                                                  _df=df, _laundry_index=laundry_index, _daily_cube=daily_cube)
         
         if daily.empty:
             st.markdown(f'<div class="alert-box"><h3>⚠️ No data found for Laundry ID: {laundry_id}</h3></div>', unsafe_allow_html=True)
             return
         
-        daily, model, forecast = forecast_demand_laundry_rf(daily, forecast_days=30)
         peak_days = forecast[forecast["yhat"] > peak_threshold]
         
         if not peak_days.empty:
@@ -198,24 +419,33 @@ def show_peak_alerts(df, laundry_id):
                                      f"Peak demand alert for Laundry {laundry_id} on the following dates:")
                 
                 if st.button("Send Alerts"):
-                    st.success(f"✅ Alerts sent to: {emails}")
+                    # Only the outbox write happens here; delivery runs on the dispatcher thread
+                    queued, recipients, rejected = queue_peak_alerts(laundry_id, peak_days, emails, message)
+                    if rejected:
+                        st.warning(f"⚠️ Skipped invalid recipients: {', '.join(rejected)}")
+                    if queued:
+                        st.success(f"✅ Alerts queued for: {', '.join(recipients)}")
+                    else:
+                        st.error("Enter at least one email address or webhook URL")
+                st.caption(f"Outbox: {outbox_status() or 'empty'}")
         else:
             st.markdown(f'<div class="success-box"><h3>✅ No peak days detected at Laundry {laundry_id} with current threshold</h3></div>', 
                        unsafe_allow_html=True)
 
-def show_resource_analysis(df, laundry_id):
+def show_resource_analysis(df, laundry_id, laundry_index=None, daily_cube=None):
     """Display resource consumption analysis"""
     st.subheader("Resource Analysis")
     
     with st.spinner("Analyzing resource consumption..."):
-        daily_usage = laundry_resource_analysis(df, laundry_id)
+        daily_usage = laundry_resource_analysis(df, laundry_id, laundry_index, daily_cube)
         
         if daily_usage.empty:
             st.markdown('<div class="alert-box"><h3>⚠️ No data found for the specified laundry</h3></div>', unsafe_allow_html=True)
             return
         
         # Create tabs for different views
-        tab1, tab2, tab3, tab4 = st.tabs(["📈 Usage Trends", "🔍 Anomaly Detection", "📊 Efficiency Metrics", "📉 Low Demand Forecast"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["📈 Usage Trends", "🔍 Anomaly Detection", "📊 Efficiency Metrics",
+                                                "📉 Low Demand Forecast", "🧺 Order Anomalies"])
         
         with tab1:
             st.markdown("### Water Consumption Over Time")
@@ -294,7 +524,7 @@ def show_resource_analysis(df, laundry_id):
             st.markdown("### Low Demand Forecast")
             low_threshold = st.slider("Low Demand Threshold", 1, 10, 3, key="low_threshold")
             
-            forecast, low_demand = detect_low_demand_days(df, laundry_id, low_threshold)
+            forecast, low_demand = detect_low_demand_days(df, laundry_id, low_threshold, laundry_index, daily_cube)
             
             if forecast is not None:
                 if not low_demand.empty:
@@ -329,7 +559,29 @@ def show_resource_analysis(df, laundry_id):
                     low_days_display = low_demand.copy()
                     low_days_display["Date"] = low_days_display["ds"].dt.strftime('%Y-%m-%d')
                     low_days_display["Expected Orders"] = low_days_display["yhat"].round(1)
-                    st.dataframe(low_days_display[["Date", "Expected Orders"]].reset_index(drop=True))
+                    columns = ["Date", "Expected Orders"]
+                    if "water_hat" in low_days_display:
+                        low_days_display["Expected Water (L)"] = low_days_display["water_hat"].round(1)
+                        low_days_display["Expected Electricity (kWh)"] = low_days_display["electricity_hat"].round(1)
+                        columns += ["Expected Water (L)", "Expected Electricity (kWh)"]
+                    st.dataframe(low_days_display[columns].reset_index(drop=True))
                 else:
                     st.markdown(f'<div class="success-box"><h3>✅ No low demand days detected below {low_threshold} orders</h3></div>', 
-                               unsafe_allow_html=True)
\ No newline at end of file
+                               unsafe_allow_html=True)
+        
+        with tab5:
+            st.markdown("### Order-Level Resource Anomalies")
+            scored = order_resource_anomalies(df, laundry_id, laundry_index)
+            flagged = scored[scored["order_anomaly"]]
+            
+            if not flagged.empty:
+                st.markdown(f'<div class="alert-box"><h3>🚨 {len(flagged)} of {len(scored)} orders deviate from their Service/Item baseline</h3></div>', 
+                           unsafe_allow_html=True)
+                st.dataframe(flagged.assign(StartDate=flagged["StartDate"].dt.strftime('%Y-%m-%d')).rename(columns={
+                    "StartDate": "Date", "Water_Litres": "Water (L)", "expected_water": "Typical Water",
+                    "Electricity_kWh": "Electricity (kWh)", "expected_electricity": "Typical Electricity", "order_z": "Score"
+                })[["Date", "TenantID", "Service", "Item", "Water (L)", "Typical Water", "Electricity (kWh)",
+                    "Typical Electricity", "Score"]].round(2).reset_index(drop=True))
+            else:
+                st.markdown(f'<div class="success-box"><h3>✅ No orders deviate from their Service/Item baseline (score > {ORDER_ANOMALY_Z})</h3></div>', 
+                           unsafe_allow_html=True)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import joblib
+import pandas as pd
+from atomic_io import atomic_write
+
+REGISTRY_DIR = os.path.join("models", "registry")
+REGISTRY_MAX_BYTES = 512 * 1024 * 1024
+
+# Incremental updates: when the new training data only appends rows to what the
+# latest model saw, extend that model on the most recent rows instead of refitting.
+# After MAX_INCREMENTS extensions the next update is a full refit.
+INCREMENTAL_WINDOW = 56
+INCREMENTAL_TREES = 10
+MAX_INCREMENTS = 7
+# Part of every key: bump when fitted models change shape so stale artifacts are never loaded
+REGISTRY_FORMAT = 4
+
+def training_data_hash(X, y):
+    """Stable hash of a training matrix and target"""
+    digest = hashlib.sha256()
+    digest.update(",".join(map(str, X.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    y = y if isinstance(y, pd.DataFrame) else pd.Series(y)
+    digest.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+    return digest.hexdigest()
+
+def model_key(kind, entity_id, feature_version, params, data_hash):
+    """Registry key for a model: entity, feature schema, hyperparameters and training data"""
+    payload = json.dumps({
+        "kind": kind,
+        "entity": str(entity_id),
+        "features": feature_version,
+        "params": params,
+        "data": data_hash,
+        "format": REGISTRY_FORMAT,
+    }, sort_keys=True, default=str)
+    return f"{kind}-{entity_id}-{hashlib.sha256(payload.encode()).hexdigest()[:24]}"
+
+def _artifact_path(key, registry_dir):
+    return os.path.join(registry_dir, f"{key}.joblib")
+
+def load_model(key, registry_dir=REGISTRY_DIR):
+    """Load a registered model, or None when missing or unreadable"""
+    path = _artifact_path(key, registry_dir)
+    try:
+        model = joblib.load(path)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated or incompatible artifact: drop it and let the caller refit
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    try:
+        os.utime(path)  # mark as recently used for eviction
+    except OSError:
+        pass
+    return model
+
+def save_model(key, model, registry_dir=REGISTRY_DIR, max_bytes=REGISTRY_MAX_BYTES):
+    """Atomically write a model artifact, then evict old ones beyond the size cap"""
+    os.makedirs(registry_dir, exist_ok=True)
+    path = _artifact_path(key, registry_dir)
+    atomic_write(path, lambda f: joblib.dump(model, f))
+    evict_models(registry_dir, max_bytes, keep=path)
+    return path
+
+def evict_models(registry_dir=REGISTRY_DIR, max_bytes=REGISTRY_MAX_BYTES, keep=None):
+    """Remove least recently used artifacts until the registry fits in max_bytes"""
+    entries = []
+    for name in os.listdir(registry_dir):
+        if not name.endswith(".joblib"):
+            continue
+        path = os.path.join(registry_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def _lineage_path(kind, entity_id, feature_version, params, registry_dir):
+    """Pointer to the latest model of an entity/feature/param lineage, whatever its data"""
+    return os.path.join(registry_dir, f"{model_key(kind, entity_id, feature_version, params, None)}.latest.json")
+
+def _read_lineage(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_lineage(path, lineage):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, lambda f: f.write(json.dumps(lineage).encode()))
+
+def extend_model(model, X_recent, y_recent, new_trees=INCREMENTAL_TREES):
+    """Add trees (RandomForest warm start) or boosting rounds (XGBoost) fitted on recent rows"""
+    if hasattr(model, "orders_model"):
+        # Orders and resources models are extended separately, on the resource targets scaled as in training
+        y_recent = pd.DataFrame(y_recent).to_numpy(dtype=float)
+        extend_model(model.orders_model, X_recent, y_recent[:, 0], new_trees)
+        scaled = model.resource_model
+        extend_model(scaled.regressor_, X_recent, scaled.transformer_.transform(y_recent[:, 1:]), new_trees)
+        return model
+    if hasattr(model, "get_booster"):
+        booster = model.get_booster()
+        model.set_params(n_estimators=new_trees)
+        model.fit(X_recent, y_recent, xgb_model=booster)
+    else:
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + new_trees)
+        model.fit(X_recent, y_recent)
+        model.set_params(warm_start=False)
+    return model
+
+def _incremental_base(lineage, X, y, registry_dir):
+    """The lineage's latest model if X/y only append rows to its training data"""
+    if lineage is None or lineage["increments"] >= MAX_INCREMENTS:
+        return None
+    rows = lineage["rows"]
+    if rows >= len(X) or training_data_hash(X.iloc[:rows], y.iloc[:rows]) != lineage["data"]:
+        return None
+    return load_model(lineage["key"], registry_dir)
+
+def fit_or_load(kind, entity_id, feature_version, make_model, params, X, y, registry_dir=REGISTRY_DIR,
+                incremental=True):
+    """Return a fitted model from the registry, training and registering it on a miss
+
+    With incremental=True a miss caused by newly appended rows extends the
+    latest model of the lineage on the last INCREMENTAL_WINDOW rows.
+    """
+    data_hash = training_data_hash(X, y)
+    key = model_key(kind, entity_id, feature_version, params, data_hash)
+    model = load_model(key, registry_dir)
+    if model is not None:
+        return model
+
+    lineage_path = _lineage_path(kind, entity_id, feature_version, params, registry_dir)
+    lineage = _read_lineage(lineage_path) if incremental else None
+    model = _incremental_base(lineage, X, y, registry_dir)
+    if model is not None:
+        model = extend_model(model, X.iloc[-INCREMENTAL_WINDOW:], y.iloc[-INCREMENTAL_WINDOW:])
+        increments = lineage["increments"] + 1
+    else:
+        model = make_model(**params)
+        model.fit(X, y)
+        increments = 0
+    save_model(key, model, registry_dir)
+    _write_lineage(lineage_path, {"key": key, "rows": len(X), "data": data_hash, "increments": increments})
+    return model
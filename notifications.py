@@ -0,0 +1,308 @@
+"""Alert notifications through a persistent outbox.
+
+The dashboard only enqueues: each recipient's message is a row in a SQLite
+outbox, written in one transaction. A background dispatcher thread runs an
+asyncio loop that claims due rows, batches them per recipient (one digest
+email or one webhook POST each), sends them concurrently under a rate limit
+and retries failures with exponential backoff. Rows are leased while being
+sent, so a crashed dispatcher's rows are picked up again.
+
+Recipients are email addresses or http(s) webhook URLs. SMTP settings come
+from the LAUNDRY_SMTP_* environment variables; aiosmtplib is used when
+installed, otherwise smtplib runs in a worker thread.
+
+Usage:
+    python notifications.py            # send everything that is due, then exit
+    python notifications.py --serve    # keep dispatching (e.g. as a service)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import smtplib
+import sqlite3
+import threading
+import time
+import urllib.request
+from email.message import EmailMessage
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH = os.path.join("outbox", "outbox.sqlite3")
+SMTP_CONFIG = {
+    "host": os.environ.get("LAUNDRY_SMTP_HOST", "localhost"),
+    "port": int(os.environ.get("LAUNDRY_SMTP_PORT", "25")),
+    "username": os.environ.get("LAUNDRY_SMTP_USER"),
+    "password": os.environ.get("LAUNDRY_SMTP_PASSWORD"),
+    "sender": os.environ.get("LAUNDRY_SMTP_SENDER", "alerts@laundry.local"),
+    "starttls": os.environ.get("LAUNDRY_SMTP_STARTTLS", "0") == "1",
+    "timeout": 30,
+}
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+# Claimed rows are retried by any dispatcher once their lease runs out
+LEASE_SECONDS = 300
+CLAIM_LIMIT = 500
+MAX_CONCURRENCY = 10
+SEND_RATE = 5.0
+POLL_SECONDS = 30
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def parse_recipients(text):
+    """(email/webhook recipients, rejected entries) from a comma/semicolon/newline separated list"""
+    recipients, rejected = [], []
+    for entry in re.split(r"[,;\n]", text or ""):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if EMAIL_PATTERN.match(entry) or entry.startswith(("http://", "https://")):
+            if entry not in recipients:
+                recipients.append(entry)
+        else:
+            rejected.append(entry)
+    return recipients, rejected
+
+def _channel(recipient):
+    return "webhook" if recipient.startswith(("http://", "https://")) else "email"
+
+def _connect(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY,
+            channel TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            created REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            last_error TEXT,
+            sent_at REAL
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+    return conn
+
+def enqueue(recipients, subject, body, path=OUTBOX_PATH):
+    """Queue one message per recipient in a single transaction; returns the number queued"""
+    now = time.time()
+    rows = [(_channel(recipient), recipient, subject, body, now, now) for recipient in recipients]
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO outbox (channel, recipient, subject, body, created, next_attempt) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    finally:
+        conn.close()
+    return len(rows)
+
+def outbox_status(path=OUTBOX_PATH):
+    """Message counts per status; empty before anything has been queued"""
+    if not os.path.exists(path):
+        return {}
+    conn = _connect(path)
+    try:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+    finally:
+        conn.close()
+
+def claim_due(path=OUTBOX_PATH, limit=CLAIM_LIMIT, now=None):
+    """Lease due messages and group them per (channel, recipient), oldest first"""
+    now = time.time() if now is None else now
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, channel, recipient, subject, body, created, attempts FROM outbox "
+                "WHERE status IN ('pending', 'sending') AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (now, limit)).fetchall()
+            conn.executemany("UPDATE outbox SET status = 'sending', next_attempt = ? WHERE id = ?",
+                             [(now + LEASE_SECONDS, row[0]) for row in rows])
+    finally:
+        conn.close()
+
+    batches = {}
+    for row_id, channel, recipient, subject, body, created, attempts in rows:
+        batches.setdefault((channel, recipient), []).append(
+            {"id": row_id, "subject": subject, "body": body, "created": created, "attempts": attempts})
+    return batches
+
+def backoff_delay(attempts):
+    """Exponential backoff with jitter before retry number `attempts`"""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+def _record_result(path, messages, error=None):
+    now = time.time()
+    conn = _connect(path)
+    try:
+        with conn:
+            if error is None:
+                conn.executemany("UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                                 [(now, message["id"]) for message in messages])
+            else:
+                updates = []
+                for message in messages:
+                    attempts = message["attempts"] + 1
+                    status = "failed" if attempts >= MAX_ATTEMPTS else "pending"
+                    updates.append((status, attempts, now + backoff_delay(attempts), str(error)[:500], message["id"]))
+                conn.executemany("UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? "
+                                 "WHERE id = ?", updates)
+    finally:
+        conn.close()
+
+def digest(messages):
+    """Subject and body of one email covering every queued message for a recipient"""
+    if len(messages) == 1:
+        return messages[0]["subject"], messages[0]["body"]
+    subject = f"{len(messages)} laundry alerts"
+    body = "\n\n---\n\n".join(f"{message['subject']}\n\n{message['body']}" for message in messages)
+    return subject, body
+
+async def send_email(recipient, messages, smtp=SMTP_CONFIG):
+    """Send a recipient's batch as one email"""
+    subject, body = digest(messages)
+    email = EmailMessage()
+    email["From"] = smtp["sender"]
+    email["To"] = recipient
+    email["Subject"] = subject
+    email.set_content(body)
+    try:
+        import aiosmtplib
+    except ImportError:
+        await asyncio.to_thread(_send_email_blocking, email, smtp)
+        return
+    await aiosmtplib.send(email, hostname=smtp["host"], port=smtp["port"], username=smtp["username"],
+                          password=smtp["password"], start_tls=smtp["starttls"], timeout=smtp["timeout"])
+
+def _send_email_blocking(email, smtp):
+    with smtplib.SMTP(smtp["host"], smtp["port"], timeout=smtp["timeout"]) as server:
+        if smtp["starttls"]:
+            server.starttls()
+        if smtp["username"]:
+            server.login(smtp["username"], smtp["password"])
+        server.send_message(email)
+
+async def send_webhook(url, messages, timeout=30):
+    """POST a recipient's batch as one JSON payload"""
+    payload = json.dumps({"alerts": [{"subject": message["subject"], "body": message["body"],
+                                      "created": message["created"]} for message in messages]}).encode()
+    request = urllib.request.Request(url, data=payload, headers={"Content-Type": "application/json"}, method="POST")
+
+    def post():
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    await asyncio.to_thread(post)
+
+class RateLimiter:
+    """Token bucket shared by the sends of one dispatch run"""
+
+    def __init__(self, rate=SEND_RATE, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+async def dispatch_due(path=OUTBOX_PATH, smtp=SMTP_CONFIG, senders=None, rate=SEND_RATE,
+                       concurrency=MAX_CONCURRENCY):
+    """Claim every due message and send the per-recipient batches; returns (sent, failed) batch counts
+
+    senders maps a channel to an async callable(recipient, messages); the
+    defaults send email over SMTP and POST webhooks.
+    """
+    senders = senders or {"email": partial(send_email, smtp=smtp), "webhook": send_webhook}
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def deliver(channel, recipient, messages):
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                await senders[channel](recipient, messages)
+            except Exception as error:
+                logger.warning("Notification to %s failed: %s", recipient, error)
+                await asyncio.to_thread(_record_result, path, messages, error)
+                return False
+            await asyncio.to_thread(_record_result, path, messages)
+            return True
+
+    sent = failed = 0
+    while True:
+        batches = await asyncio.to_thread(claim_due, path)
+        if not batches:
+            return sent, failed
+        results = await asyncio.gather(*(deliver(channel, recipient, messages)
+                                         for (channel, recipient), messages in batches.items()))
+        sent += sum(results)
+        failed += len(results) - sum(results)
+
+class Dispatcher(threading.Thread):
+    """Daemon thread draining the outbox on its own event loop, woken on enqueue and every POLL_SECONDS"""
+
+    def __init__(self, path=OUTBOX_PATH, smtp=SMTP_CONFIG, rate=SEND_RATE, poll_seconds=POLL_SECONDS):
+        super().__init__(name="notification-dispatcher", daemon=True)
+        self.path = path
+        self.smtp = smtp
+        self.rate = rate
+        self.poll_seconds = poll_seconds
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wakeup.clear()
+            try:
+                # Nothing has been queued until enqueue creates the outbox
+                if os.path.exists(self.path):
+                    asyncio.run(dispatch_due(self.path, self.smtp, rate=self.rate))
+            except Exception:
+                # Send failures are recorded per batch; this is the outbox itself, retried next cycle
+                logger.exception("Notification dispatch failed")
+            self.wakeup.wait(self.poll_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued alert notifications")
+    parser.add_argument("--serve", action="store_true", help="keep dispatching instead of exiting when drained")
+    parser.add_argument("--outbox", default=OUTBOX_PATH, help="outbox database path")
+    args = parser.parse_args()
+
+    while True:
+        sent, failed = asyncio.run(dispatch_due(args.outbox))
+        print(f"Sent {sent} batches, {failed} failed; outbox: {outbox_status(args.outbox)}")
+        if not args.serve:
+            break
+        time.sleep(POLL_SECONDS)
+
+if __name__ == "__main__":
+    main()
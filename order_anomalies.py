@@ -0,0 +1,66 @@
+"""Order-level resource anomaly scoring against per (Service, Item, LaundryID) baselines.
+
+Daily totals hide a single bad wash cycle, so each order's Water_Litres and
+Electricity_kWh are compared with the typical usage of the same service and
+item at the same laundry. Baselines are robust (median and scaled MAD) and
+precomputed into a lookup table; scoring is one join plus column arithmetic.
+"""
+import numpy as np
+import pandas as pd
+
+BASELINE_KEYS = ["Service", "Item", "LaundryID"]
+ORDER_RESOURCES = {"water": "Water_Litres", "electricity": "Electricity_kWh"}
+# Groups with fewer orders use the fleet-wide (Service, Item) baseline instead
+MIN_BASELINE_ORDERS = 8
+MAD_TO_SIGMA = 1.4826
+# Scale floor as a fraction of the median, so near-constant groups do not flag rounding noise
+MIN_RELATIVE_SCALE = 0.05
+ORDER_ANOMALY_Z = 3.5
+
+def _robust_stats(df, keys):
+    """Order count, median and MAD-based scale of each resource per group"""
+    grouped = df.groupby(keys, observed=True)
+    stats = {"orders": grouped.size()}
+    for name, column in ORDER_RESOURCES.items():
+        median = grouped[column].median()
+        deviation = (df[column] - grouped[column].transform("median")).abs()
+        mad = deviation.groupby([df[key] for key in keys], observed=True).median()
+        stats[f"{name}_median"] = median
+        stats[f"{name}_scale"] = np.maximum(mad * MAD_TO_SIGMA, median.abs() * MIN_RELATIVE_SCALE)
+    return pd.DataFrame(stats)
+
+def build_order_baselines(df):
+    """Lookup table of usage baselines per (Service, Item, LaundryID)
+
+    Sparse groups fall back to the (Service, Item) baseline across the fleet;
+    the table is indexed by BASELINE_KEYS and holds the resolved values.
+    """
+    local = _robust_stats(df, BASELINE_KEYS)
+    fleet = _robust_stats(df, BASELINE_KEYS[:-1])
+    fallback = fleet.reindex(local.index.droplevel("LaundryID"))
+    fallback.index = local.index
+    sparse = local["orders"] < MIN_BASELINE_ORDERS
+    baselines = local.drop(columns="orders").mask(sparse, fallback.drop(columns="orders"), axis=0)
+    baselines["orders"] = local["orders"]
+    baselines["fleet_fallback"] = sparse
+    return baselines
+
+def score_orders(orders, baselines):
+    """Join orders to their baselines and add robust z-scores and an anomaly flag
+
+    Orders whose (Service, Item, LaundryID) has no baseline get NaN scores and
+    are never flagged.
+    """
+    matched = orders[BASELINE_KEYS].merge(baselines.reset_index(), on=BASELINE_KEYS, how="left",
+                                          validate="many_to_one")
+    scored = orders.copy()
+    z = np.zeros(len(orders))
+    for name, column in ORDER_RESOURCES.items():
+        expected = matched[f"{name}_median"].to_numpy(dtype=float)
+        score = (orders[column].to_numpy(dtype=float) - expected) / matched[f"{name}_scale"].to_numpy(dtype=float)
+        scored[f"expected_{name}"] = expected
+        scored[f"{name}_z"] = score
+        z = np.fmax(z, np.abs(score))
+    scored["order_z"] = np.where(matched["orders"].isna().to_numpy(), np.nan, z)
+    scored["order_anomaly"] = scored["order_z"] > ORDER_ANOMALY_Z
+    return scored
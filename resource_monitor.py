@@ -0,0 +1,204 @@
+"""Streaming resource anomaly detection for the laundry fleet.
+
+Per laundry the monitor keeps the running sums of a least-squares fit of
+daily water and electricity on the order count, plus a robust residual scale
+(an exponentially weighted mean absolute residual whose updates are clipped,
+so one leak cannot inflate it). Residual spread grows with the number of
+washes, so residuals are scaled by sqrt(orders) before scoring. Each new day is scored against the state
+built from the days before it and then folded in: O(1) per laundry per day,
+and the state is persisted so only days added since the last run are scored.
+
+Usage:
+    python resource_monitor.py     # score the days added since the last run
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+from atomic_io import atomic_write
+
+MONITOR_DIR = os.path.join("models", "monitor")
+RESOURCES = ["water", "electricity"]
+# Days a laundry must have been observed before its days can be flagged
+WARMUP_DAYS = 14
+SCALE_SPAN = 28
+SCALE_ALPHA = 2 / (SCALE_SPAN + 1)
+# Residuals enter the scale clipped at SCALE_CLIP scales
+SCALE_CLIP = 3.0
+# Mean absolute deviation -> standard deviation for normal residuals
+MEAN_ABS_TO_SIGMA = np.sqrt(np.pi / 2)
+ANOMALY_Z = 3.0
+
+SUM_COLUMNS = ["n", "sum_x", "sum_xx"] + [f"sum_{r}" for r in RESOURCES] + [f"sum_x_{r}" for r in RESOURCES]
+STATE_COLUMNS = SUM_COLUMNS + [f"scale_{r}" for r in RESOURCES] + ["last_date"]
+
+def empty_state(entities):
+    """Monitor state for laundries that have not been observed yet"""
+    state = pd.DataFrame(0.0, index=pd.Index(entities, name="entity"), columns=SUM_COLUMNS)
+    for r in RESOURCES:
+        state[f"scale_{r}"] = np.nan
+    state["last_date"] = pd.NaT
+    return state
+
+def expected_usage(sums, orders):
+    """Least-squares expected usage per resource for the given order counts, one fit per row of sums
+
+    sums maps SUM_COLUMNS to aligned arrays. Rows fitted on a single distinct
+    order count fall back to the mean usage; rows with no history give NaN.
+    """
+    n, sx, sxx = sums["n"], sums["sum_x"], sums["sum_xx"]
+    denom = n * sxx - sx ** 2
+    fitted = denom > 1e-9
+    expected = {}
+    for r in RESOURCES:
+        sy, sxy = sums[f"sum_{r}"], sums[f"sum_x_{r}"]
+        slope = np.where(fitted, (n * sxy - sx * sy) / np.where(fitted, denom, 1.0), 0.0)
+        intercept = np.where(n > 0, (sy - slope * sx) / np.maximum(n, 1), np.nan)
+        expected[r] = intercept + slope * orders
+    return expected
+
+def _observe(arrays, rows, orders, usage):
+    """Score one day for the given state rows, then fold the day into them (in place)"""
+    sums = {name: arrays[name][rows] for name in SUM_COLUMNS}
+    expected = expected_usage(sums, orders)
+    warm = sums["n"] >= WARMUP_DAYS
+
+    result = {"z": np.zeros(len(rows))}
+    for r in RESOURCES:
+        residual = usage[r] - expected[r]
+        unit_residual = residual / np.sqrt(np.maximum(orders, 1))
+        scale = arrays[f"scale_{r}"][rows]
+        sigma = scale * MEAN_ABS_TO_SIGMA
+        z = np.where(warm & (sigma > 0), np.abs(unit_residual) / np.where(sigma > 0, sigma, 1.0), 0.0)
+        result[f"expected_{r}"] = expected[r]
+        result[f"error_{r}"] = residual
+        result["z"] = np.maximum(result["z"], np.nan_to_num(z))
+
+        abs_residual = np.abs(np.nan_to_num(unit_residual))
+        clipped = np.where(warm, np.minimum(abs_residual, SCALE_CLIP * np.nan_to_num(scale)), abs_residual)
+        has_residual = ~np.isnan(residual)
+        updated = np.where(np.isnan(scale), clipped, (1 - SCALE_ALPHA) * scale + SCALE_ALPHA * clipped)
+        arrays[f"scale_{r}"][rows] = np.where(has_residual, updated, scale)
+
+    arrays["n"][rows] += 1
+    arrays["sum_x"][rows] += orders
+    arrays["sum_xx"][rows] += orders ** 2
+    for r in RESOURCES:
+        arrays[f"sum_{r}"][rows] += usage[r]
+        arrays[f"sum_x_{r}"][rows] += orders * usage[r]
+
+    result["anomaly"] = result["z"] > ANOMALY_Z
+    return result
+
+def observe_days(days, state=None, entity_column="LaundryID"):
+    """Score daily totals in date order against the running state and return (scores, updated state)
+
+    days has entity_column, StartDate, orders and the RESOURCES columns, at
+    most one row per entity and date. Days on or before an entity's last
+    observed date are skipped. Every date is one vectorized step over the
+    laundries reporting that day. Scores are aligned with the scored rows.
+    """
+    entities = days[entity_column].astype(str)
+    if state is None:
+        state = empty_state([])
+    state = pd.concat([state, empty_state(entities[~entities.isin(state.index)].unique())])
+
+    last_date = state["last_date"].reindex(entities).to_numpy()
+    fresh = pd.isna(last_date) | (days["StartDate"].to_numpy() > last_date)
+    days = days[fresh].sort_values("StartDate", kind="stable")
+    rows = state.index.get_indexer(days[entity_column].astype(str))
+
+    arrays = {name: state[name].to_numpy(dtype=float, copy=True) for name in STATE_COLUMNS[:-1]}
+    orders = days["orders"].to_numpy(dtype=float)
+    usage = {r: days[r].to_numpy(dtype=float) for r in RESOURCES}
+    columns = [f"{kind}_{r}" for r in RESOURCES for kind in ("expected", "error")] + ["z", "anomaly"]
+    out = {name: np.empty(len(days), dtype=bool if name == "anomaly" else float) for name in columns}
+
+    dates = days["StartDate"].to_numpy()
+    boundaries = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1], True])
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        day = slice(start, end)
+        result = _observe(arrays, rows[day], orders[day], {r: usage[r][day] for r in RESOURCES})
+        for name in columns:
+            out[name][day] = result[name]
+
+    for name, values in arrays.items():
+        state[name] = values
+    latest = days.groupby(days[entity_column].astype(str))["StartDate"].max()
+    state.loc[latest.index, "last_date"] = latest.to_numpy()
+
+    scores = days[[entity_column, "StartDate"]].assign(**out)
+    return scores, state
+
+def score_fleet(daily_cube):
+    """Scores of every laundry-day of the fleet, with its orders and usage, from one batched replay"""
+    entity_column = daily_cube.index.names[0]
+    days = daily_cube.reset_index()
+    scores, _ = observe_days(days, entity_column=entity_column)
+    return scores.join(days.loc[scores.index, ["orders"] + RESOURCES])
+
+def scan_fleet(daily_cube=None, top_days=20, scores=None):
+    """Rank the fleet's worst resource offenders from every laundry-day's scores
+
+    scores is score_fleet's output (entity column first); it is computed from
+    daily_cube when not given. Returns (offenders, worst_days): per-laundry
+    anomaly counts, peak score and excess usage on anomalous days, ranked
+    worst first, and the highest-scoring individual days across the fleet.
+    """
+    if scores is None:
+        scores = score_fleet(daily_cube)
+    entity_column = scores.columns[0]
+
+    flagged = scores["anomaly"]
+    excess = {f"excess_{r}": scores[f"error_{r}"].clip(lower=0).where(flagged, 0.0) for r in RESOURCES}
+    grouped = scores.assign(**excess, anomaly_date=scores["StartDate"].where(flagged)).groupby(entity_column)
+    offenders = pd.DataFrame({
+        "days": grouped.size(),
+        "anomaly_days": grouped["anomaly"].sum(),
+        "max_z": grouped["z"].max(),
+        **{name: grouped[name].sum() for name in excess},
+        "last_anomaly": grouped["anomaly_date"].max(),
+    })
+    offenders["anomaly_rate"] = offenders["anomaly_days"] / offenders["days"]
+    offenders = offenders.sort_values(["anomaly_days", "max_z"], ascending=False)
+
+    worst_days = scores.nlargest(top_days, "z")
+    return offenders, worst_days[worst_days["z"] > 0].reset_index(drop=True)
+
+def _state_path(monitor_dir):
+    return os.path.join(monitor_dir, "resource_state.parquet")
+
+def load_state(monitor_dir=MONITOR_DIR):
+    """Persisted monitor state, or None before the first run"""
+    try:
+        return pd.read_parquet(_state_path(monitor_dir))
+    except (FileNotFoundError, ImportError):
+        return None
+
+def save_state(state, monitor_dir=MONITOR_DIR):
+    """Atomically persist the monitor state"""
+    os.makedirs(monitor_dir, exist_ok=True)
+    path = _state_path(monitor_dir)
+    atomic_write(path, state.to_parquet)
+    return path
+
+def update_monitor(daily_cube, monitor_dir=MONITOR_DIR):
+    """Score the days added since the last run and persist the new state; returns the new scores"""
+    days = daily_cube.reset_index()
+    scores, state = observe_days(days, load_state(monitor_dir), entity_column=daily_cube.index.names[0])
+    save_state(state, monitor_dir)
+    return scores
+
+def main():
+    from resources import read_dataset, build_daily_cube
+
+    start = time.perf_counter()
+    scores = update_monitor(build_daily_cube(read_dataset(), "LaundryID"))
+    anomalies = scores[scores["anomaly"]].sort_values("z", ascending=False)
+    print(f"Scored {len(scores)} new laundry-days in {time.perf_counter() - start:.2f}s, "
+          f"{len(anomalies)} anomalies")
+    if not anomalies.empty:
+        print(anomalies.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,218 @@
 import pandas as pd
+import numpy as np
 import streamlit as st
+import hashlib
+import json
 import os
+from atomic_io import atomic_write
+
+DATA_PATH = "data/better_laundry_service_dataset.csv"
+CACHE_DIR = os.path.join("data", ".cache")
+
+# Compact dtypes for the order table. Integer columns are only narrowed when
+# their observed range fits, so a wider extract never silently wraps.
+CATEGORICAL_COLUMNS = ["Country", "City", "LaundryID", "TenantID", "Service", "Item"]
+FLOAT32_COLUMNS = ["Fee", "Water_Litres", "Electricity_kWh"]
+INT8_COLUMNS = ["IsHoliday", "DayOfWeek", "IsWeekend"]
+# Bump when apply_schema changes so stale Parquet sidecars get rebuilt
+SCHEMA_VERSION = 1
+
+def _file_stat(path):
+    """Return the size/mtime pair used as a cheap change check"""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """Hash the file contents in chunks so large extracts stay out of memory"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_paths(csv_path, cache_dir):
+    """Locate the Parquet sidecar and its metadata file for a CSV"""
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return (os.path.join(cache_dir, f"{name}.parquet"),
+            os.path.join(cache_dir, f"{name}.meta.json"))
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_meta(meta_path, meta):
+    atomic_write(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+
+def _read_sidecar(parquet_path):
+    """The cached frame, or None (and the sidecar removed) when it cannot be read"""
+    try:
+        return pd.read_parquet(parquet_path)
+    except (OSError, ValueError):
+        try:
+            os.remove(parquet_path)
+        except OSError:
+            pass
+        return None
+
+def dataset_version(csv_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Content hash identifying the dataset, reused from the sidecar when the CSV is untouched"""
+    _, meta_path = _cache_paths(csv_path, cache_dir)
+    meta = _read_meta(meta_path)
+    stat = _file_stat(csv_path)
+    if meta is not None and meta.get("size") == stat["size"] and meta.get("mtime_ns") == stat["mtime_ns"]:
+        return meta["sha256"]
+    return file_content_hash(csv_path)
+
+def apply_schema(df):
+    """Convert columns to categorical / downcast numeric dtypes"""
+    df = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("float32")
+    int8_info = np.iinfo(np.int8)
+    for col in INT8_COLUMNS:
+        if col in df.columns and df[col].notna().all() and df[col].between(int8_info.min, int8_info.max).all():
+            df[col] = df[col].astype("int8")
+    return df
+
+def widen_schema(df):
+    """Undo apply_schema, giving the frame pandas would have parsed by default"""
+    df = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("float64")
+    for col in INT8_COLUMNS:
+        if col in df.columns and df[col].dtype == "int8":
+            df[col] = df[col].astype("int64")
+    return df
+
+def memory_footprint(df):
+    """Deep memory usage of a frame in bytes"""
+    return int(df.memory_usage(deep=True).sum())
+
+def schema_memory_report(df):
+    """Return (default_dtype_bytes, compact_bytes) for a schema-typed frame"""
+    return memory_footprint(widen_schema(df)), memory_footprint(df)
+
+def drop_unused_categories(df):
+    """Drop categories not present in an entity slice so value_counts stays tidy"""
+    df = df.copy()
+    for col in df.select_dtypes("category").columns:
+        df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+def build_entity_index(df, column):
+    """Map each value of an entity column to the row positions holding it"""
+    return dict(df.groupby(column, observed=True, sort=False).indices)
+
+def select_entity(df, column, entity_id, index=None):
+    """Rows for one entity, via the prebuilt position index when available"""
+    if index is None:
+        return df[df[column] == entity_id]
+    positions = index.get(entity_id)
+    if positions is None:
+        return df.iloc[0:0]
+    return df.iloc[positions]
+
+# Per-day totals materialized for every entity; views read these instead of
+# regrouping raw orders
+DAILY_AGGREGATES = {
+    "orders": ("StartDate", "size"),
+    "water": ("Water_Litres", "sum"),
+    "electricity": ("Electricity_kWh", "sum"),
+    "fee": ("Fee", "sum"),
+    "holiday": ("IsHoliday", "max"),
+}
+
+def daily_totals(df):
+    """Aggregate one entity's orders into per-day totals indexed by StartDate"""
+    return df.groupby("StartDate").agg(**DAILY_AGGREGATES)
+
+def build_daily_cube(df, column):
+    """Aggregate orders into an (entity, StartDate) -> totals cube"""
+    return df.groupby([column, "StartDate"], observed=True).agg(**DAILY_AGGREGATES).sort_index()
+
+def entity_daily(cube, entity_id):
+    """One entity's per-day totals from the cube, indexed by StartDate"""
+    try:
+        return cube.xs(entity_id, level=0)
+    except KeyError:
+        return cube.iloc[0:0].droplevel(0)
+
+def tenant_histories(df, daily_cube=None):
+    """(tenant id, its orders' StartDate/IsHoliday rows, its daily totals) for every tenant"""
+    if daily_cube is None:
+        daily_cube = build_daily_cube(df, "TenantID")
+    for tenant_id, positions in build_entity_index(df, "TenantID").items():
+        yield str(tenant_id), df.iloc[positions][["StartDate", "IsHoliday"]], entity_daily(daily_cube, tenant_id)
+
+def _parse_csv(csv_path):
+    return apply_schema(pd.read_csv(csv_path, parse_dates=["StartDate"]))
+
+def read_dataset(csv_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Read the dataset through a Parquet sidecar, rebuilt only when the CSV changes"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return _parse_csv(csv_path)
+
+    parquet_path, meta_path = _cache_paths(csv_path, cache_dir)
+    stat = _file_stat(csv_path)
+    meta = _read_meta(meta_path)
+
+    if meta is not None and meta.get("schema") == SCHEMA_VERSION and os.path.exists(parquet_path):
+        df = None
+        if meta.get("size") == stat["size"] and meta.get("mtime_ns") == stat["mtime_ns"]:
+            df = _read_sidecar(parquet_path)
+        # Touched but possibly unchanged (e.g. re-synced extract): confirm by content
+        elif meta.get("size") == stat["size"]:
+            content_hash = file_content_hash(csv_path)
+            if meta.get("sha256") == content_hash:
+                df = _read_sidecar(parquet_path)
+                if df is not None:
+                    _write_meta(meta_path, {**stat, "sha256": content_hash, "schema": SCHEMA_VERSION})
+        if df is not None:
+            return df
+
+    df = _parse_csv(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    atomic_write(parquet_path, lambda f: df.to_parquet(f, index=False))
+    _write_meta(meta_path, {**stat, "sha256": file_content_hash(csv_path), "schema": SCHEMA_VERSION})
+    return df
 
 @st.cache_data
 def load_data():
     """Load and cache the dataset"""
-    return pd.read_csv("data/better_laundry_service_dataset.csv", parse_dates=["StartDate"])
+    return read_dataset()
+
+@st.cache_data
+def load_dataset_version():
+    """Version of the dataset served by load_data, used to key derived caches"""
+    return dataset_version()
+
+@st.cache_resource
+def load_entity_index(column):
+    """Build the entity -> row positions index once per process"""
+    return build_entity_index(load_data(), column)
+
+@st.cache_resource
+def load_daily_cube(column):
+    """Build the per-entity daily aggregate cube once per process"""
+    return build_daily_cube(load_data(), column)
+
+@st.cache_data
+def load_memory_report():
+    """Cache the before/after memory footprint of the loaded dataset"""
+    return schema_memory_report(load_data())
 
 def save_report(content, filename, directory="reports"):
     """Save generated reports to files"""